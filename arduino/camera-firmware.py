@@ -23,6 +23,10 @@ ALERT_INTERVAL = 5000
 ACTIVE_INTERVAL = 500
 ALERT_TIMEOUT = 30000
 
+# Persistent server session: reuse one connection for many uploads and
+# reconnect before the server's 60 second idle timeout closes it
+SESSION_IDLE_TIMEOUT = 50000
+
 # Image Quality Settings
 STANDBY_QUALITY = 85
 ALERT_QUALITY = 90
@@ -41,6 +45,8 @@ last_server_command_time = 0
 remain_in_alert = False
 wifi_connected = False
 offline_mode = False
+server_sock = None
+last_upload_time = 0
 
 # Sensor data from Uno
 sensor_data = {
@@ -183,37 +189,85 @@ def capture_and_upload():
         print(f"Capture/upload error: {e}")
         offline_mode = True
 
+def open_server_session():
+    """Open a new connection to the server"""
+    s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    s.settimeout(5.0)
+    s.connect((SERVER_IP, SERVER_PORT))
+    return s
+
+def close_server_session():
+    """Close the current server connection, if any"""
+    global server_sock
+
+    if server_sock is not None:
+        try:
+            server_sock.close()
+        except Exception:
+            pass
+        server_sock = None
+
+def read_response_line(s):
+    """Read one newline-terminated JSON response from the server"""
+    data = b""
+    while not data.endswith(b"\n") and len(data) < 1024:
+        chunk = s.recv(512)
+        if not chunk:
+            break
+        data += chunk
+    return data
+
 def upload_to_server(img_data, metadata_json):
-    """Upload image and metadata to server via HTTP POST"""
-    try:
-        # Create socket connection
-        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        s.settimeout(5.0)
-        s.connect((SERVER_IP, SERVER_PORT))
+    """Upload image and metadata to server over a persistent v2 session"""
+    global server_sock, last_upload_time
 
-        # Send metadata header
-        header = f"{frame_count},{len(img_data)}\n"
-        s.send(header.encode())
+    metadata_bytes = metadata_json.encode()
+    header = f"v2,{frame_count},{len(img_data)},{len(metadata_bytes)}\n"
 
-        # Send image data
-        s.sendall(img_data)
+    # Drop the session if the server has likely closed it for being idle
+    if server_sock is not None:
+        if time.ticks_diff(time.ticks_ms(), last_upload_time) > SESSION_IDLE_TIMEOUT:
+            close_server_session()
 
-        # Try to receive response (optional)
+    for attempt in range(2):
+        reused = server_sock is not None
         try:
-            response_data = s.recv(512)
-            s.close()
+            if server_sock is None:
+                server_sock = open_server_session()
 
-            if response_data:
-                response = json.loads(response_data.decode())
-                return response
-        except:
-            pass
+            # Send header announcing image and metadata lengths
+            server_sock.send(header.encode())
+
+            # Send image data followed by the metadata JSON
+            server_sock.sendall(img_data)
+            server_sock.sendall(metadata_bytes)
+            break
+
+        except Exception as e:
+            close_server_session()
+            if reused and attempt == 0:
+                # Stale session, the frame did not go out: reconnect and send it again
+                print(f"Session lost ({e}), reconnecting")
+                continue
+            print(f"Upload error: {e}")
+            return None
+
+    # The frame is sent at most once from here on: the server may already
+    # have processed it, so a missing reply is not a reason to send it again
+    try:
+        response_data = read_response_line(server_sock)
+        last_upload_time = time.ticks_ms()
+
+        if response_data:
+            return json.loads(response_data.decode())
 
-        s.close()
+        # Server closed the session without answering
+        close_server_session()
         return {"status": "ok", "next_mode": "remain", "action": "none"}
 
     except Exception as e:
-        print(f"Upload error: {e}")
+        close_server_session()
+        print(f"No response from server: {e}")
         return None
 
 def process_server_response(response):
@@ -0,0 +1,286 @@
+# CatCam Ingest Load Generator
+# Simulates a fleet of Nicla Vision cameras uploading to catcam_server.py
+# and reports throughput, round-trip latency and errors as JSON
+
+import asyncio
+import argparse
+import json
+import random
+import sys
+import time
+from collections import Counter
+
+# Server defaults (match catcam_server.py)
+HOST = '127.0.0.1'
+PORT = 8888
+
+# Mode timing constants (milliseconds, match camera-firmware.py)
+STANDBY_INTERVAL = 30000
+ALERT_INTERVAL = 5000
+ACTIVE_INTERVAL = 500
+ALERT_TIMEOUT = 30000
+
+# Client behaviour (match camera-firmware.py)
+CONNECT_TIMEOUT = 5.0
+SESSION_IDLE_TIMEOUT = 50000
+
+# Report format version, bump when fields change meaning
+REPORT_SCHEMA = 1
+
+INTERVALS = {
+    "standby": STANDBY_INTERVAL,
+    "alert": ALERT_INTERVAL,
+    "active": ACTIVE_INTERVAL,
+}
+
+
+def make_jpeg(size):
+    """Fake JPEG payload of the given size (SOI marker, random body, EOI marker)"""
+    body = random.randbytes(max(0, size - 4))
+    return b'\xff\xd8' + body + b'\xff\xd9'
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+class Stats:
+    """Counters shared by all virtual devices"""
+    def __init__(self):
+        self.latencies = []
+        self.frames = 0
+        self.bytes_sent = 0
+        self.errors = Counter()
+        self.frames_by_mode = Counter()
+        self.next_modes = Counter()
+        self.actions = Counter()
+        self.mode_changes = 0
+        self.connects = 0
+
+    def report(self, config, elapsed):
+        latencies = sorted(l * 1000 for l in self.latencies)
+        return {
+            "schema": REPORT_SCHEMA,
+            "config": config,
+            "duration_s": round(elapsed, 3),
+            "frames": self.frames,
+            "errors": sum(self.errors.values()),
+            "error_types": dict(self.errors),
+            "throughput_fps": round(self.frames / elapsed, 3) if elapsed else 0.0,
+            "bytes_sent": self.bytes_sent,
+            "connects": self.connects,
+            "latency_ms": {
+                "mean": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+                "p50": round(percentile(latencies, 50), 3),
+                "p95": round(percentile(latencies, 95), 3),
+                "p99": round(percentile(latencies, 99), 3),
+                "max": round(latencies[-1], 3) if latencies else 0.0,
+            },
+            "frames_by_mode": dict(self.frames_by_mode),
+            "next_mode_counts": dict(self.next_modes),
+            "action_counts": dict(self.actions),
+            "mode_changes": self.mode_changes,
+        }
+
+
+class VirtualDevice:
+    """One simulated camera following the firmware's mode schedule"""
+    def __init__(self, index, args, stats):
+        self.device_id = f"loadgen-{index:04d}"
+        self.args = args
+        self.stats = stats
+        self.mode = "standby"
+        self.remain_in_alert = False
+        self.last_alert_trigger = 0.0
+        self.frame_count = 0
+        self.reader = None
+        self.writer = None
+        self.last_upload = 0.0
+        self.payload = make_jpeg(args.image_size)
+
+    def scaled(self, ms):
+        """Firmware interval in seconds, compressed by --time-scale"""
+        return ms / 1000 / self.args.time_scale
+
+    def set_mode(self, new_mode):
+        if new_mode != self.mode:
+            self.stats.mode_changes += 1
+            self.mode = new_mode
+            if new_mode == "alert":
+                self.last_alert_trigger = time.monotonic()
+
+    def process_server_response(self, response):
+        """Same transitions as process_server_response in camera-firmware.py"""
+        next_mode = response.get("next_mode")
+        if next_mode == "remain_alert":
+            self.remain_in_alert = True
+            if self.mode != "alert":
+                self.set_mode("alert")
+        elif next_mode in ("standby", "alert", "active"):
+            self.remain_in_alert = False
+            self.set_mode(next_mode)
+
+        action = response.get("action")
+        if action == "start_stream":
+            self.set_mode("active")
+        elif action == "stop_stream" and self.mode == "active":
+            self.set_mode("standby")
+
+    def check_alert_timeout(self):
+        if self.mode == "alert" and not self.remain_in_alert:
+            if time.monotonic() - self.last_alert_trigger > self.scaled(ALERT_TIMEOUT):
+                self.set_mode("standby")
+
+    def build_upload(self, motion):
+        metadata = {
+            "device_id": self.device_id,
+            "timestamp_utc": time.time(),
+            "mode": self.mode,
+            "seq": self.frame_count,
+            "sensor": {"motion": motion, "temperature_c": 21.5, "humidity": 40.0},
+            "capture": {"exposure_ms": 0, "resolution": "320x240", "format": "jpg"},
+        }
+        if self.args.protocol == "legacy":
+            return f"{self.frame_count},{len(self.payload)}\n".encode(), b''
+        metadata_bytes = json.dumps(metadata).encode()
+        header = f"v2,{self.frame_count},{len(self.payload)},{len(metadata_bytes)}\n"
+        return header.encode(), metadata_bytes
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except Exception:
+                pass
+        self.reader = self.writer = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.args.host, self.args.port), CONNECT_TIMEOUT
+        )
+        self.stats.connects += 1
+
+    async def upload(self, motion):
+        """Send one frame and wait for its response, returns the parsed JSON"""
+        header, metadata_bytes = self.build_upload(motion)
+
+        # Mirror the firmware: drop a session that the server may have timed out
+        if self.writer is not None and time.monotonic() - self.last_upload > SESSION_IDLE_TIMEOUT / 1000:
+            await self.close()
+        if self.writer is None:
+            await self.connect()
+
+        self.writer.write(header)
+        self.writer.write(self.payload)
+        self.writer.write(metadata_bytes)
+        await self.writer.drain()
+        line = await asyncio.wait_for(self.reader.readline(), self.args.response_timeout)
+        self.last_upload = time.monotonic()
+        self.stats.bytes_sent += len(header) + len(self.payload) + len(metadata_bytes)
+
+        if not self.args.keepalive or not line:
+            await self.close()
+        if not line:
+            raise ConnectionError("connection closed without response")
+        return json.loads(line)
+
+    async def run(self, deadline):
+        # Spread devices over the first interval instead of a thundering herd
+        await asyncio.sleep(random.uniform(0, self.scaled(INTERVALS[self.mode])))
+        while time.monotonic() < deadline:
+            started = time.monotonic()
+            self.frame_count += 1
+
+            # Motion sensor on the Uno can push standby into alert
+            motion = random.random() < self.args.motion_rate
+            if motion and self.mode == "standby":
+                self.remain_in_alert = False
+                self.set_mode("alert")
+
+            mode_at_capture = self.mode
+            try:
+                response = await self.upload(motion)
+            except Exception as e:
+                self.stats.errors[type(e).__name__] += 1
+                await self.close()
+            else:
+                self.stats.latencies.append(time.monotonic() - started)
+                self.stats.frames += 1
+                self.stats.frames_by_mode[mode_at_capture] += 1
+                self.stats.next_modes[response.get("next_mode", "missing")] += 1
+                self.stats.actions[response.get("action", "missing")] += 1
+                self.process_server_response(response)
+
+            self.check_alert_timeout()
+
+            # Firmware captures once the interval has elapsed since the last capture
+            wait = self.scaled(INTERVALS.get(self.mode, STANDBY_INTERVAL)) - (time.monotonic() - started)
+            if wait > 0:
+                await asyncio.sleep(min(wait, max(0.0, deadline - time.monotonic())))
+        await self.close()
+
+
+async def run_fleet(args):
+    stats = Stats()
+    devices = [VirtualDevice(i, args, stats) for i in range(args.devices)]
+    started = time.monotonic()
+    deadline = started + args.duration
+    await asyncio.gather(*(device.run(deadline) for device in devices))
+    elapsed = time.monotonic() - started
+
+    config = {
+        "label": args.label,
+        "host": args.host,
+        "port": args.port,
+        "devices": args.devices,
+        "duration_s": args.duration,
+        "time_scale": args.time_scale,
+        "image_size": args.image_size,
+        "motion_rate": args.motion_rate,
+        "protocol": args.protocol,
+        "keepalive": args.keepalive,
+    }
+    return stats.report(config, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate N CatCam devices against catcam_server.py")
+    parser.add_argument('--host', default=HOST)
+    parser.add_argument('--port', type=int, default=PORT)
+    parser.add_argument('--devices', type=int, default=10, help="Number of virtual devices")
+    parser.add_argument('--duration', type=float, default=30.0, help="Test length in seconds")
+    parser.add_argument('--time-scale', type=float, default=1.0,
+                        help="Divide firmware intervals by this (10 = ten times faster)")
+    parser.add_argument('--image-size', type=int, default=30000, help="JPEG payload bytes")
+    parser.add_argument('--motion-rate', type=float, default=0.3,
+                        help="Probability that a capture reports motion")
+    parser.add_argument('--protocol', choices=['v2', 'legacy'], default='v2')
+    parser.add_argument('--no-keepalive', dest='keepalive', action='store_false',
+                        help="Open a new connection per frame")
+    parser.add_argument('--response-timeout', type=float, default=5.0)
+    parser.add_argument('--label', default='', help="Free-form tag stored in the report (e.g. engine name)")
+    parser.add_argument('--seed', type=int, help="Random seed for repeatable runs")
+    parser.add_argument('--output', help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+
+    report = asyncio.run(run_fleet(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+        print(f"Report written to {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,18 @@
 import socket
 import os
 import json
+import asyncio
+import argparse
+import importlib.util
+import queue
+import re
+import signal
+import sys
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
+import threading
 from threading import Thread
 import time
 
@@ -15,60 +26,928 @@ SAVE_DIR = 'received_images'
 METADATA_DIR = 'metadata'
 LOG_FILE = 'catcam_log.txt'
 
+# Log writer: lines are queued and written in batches by a background thread
+LOG_QUEUE_SIZE = 10000
+LOG_FLUSH_LINES = 200
+LOG_FLUSH_INTERVAL = 0.5
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 3
+
+# Write-behind storage: frames are persisted by a worker pool after the
+# device has been answered
+STORAGE_WORKERS = 2
+STORAGE_QUEUE_SIZE = 256
+# "none":   leave flushing to the OS
+# "batch":  fsync every STORAGE_FSYNC_BATCH files or STORAGE_FSYNC_INTERVAL seconds
+# "always": fsync every file before it is counted as written
+STORAGE_DURABILITY = 'none'
+STORAGE_FSYNC_BATCH = 32
+STORAGE_FSYNC_INTERVAL = 1.0
+STORAGE_FULL_LOG_INTERVAL = 5.0
+
+# Detection stage: frames from concurrent uploads are micro-batched and run
+# on a process pool (0 workers runs detection inline in the connection thread).
+# Inline by default: the placeholder detector is far cheaper than a round trip
+# to a worker process
+DETECTION_WORKERS = 0
+DETECTION_MAX_BATCH = 8
+# Extra time an idle worker's batch waits to fill; 0 sends it right away
+DETECTION_MAX_WAIT = 0.0
+DETECTION_LATENCY_SAMPLES = 1000
+
+# Dashboard database bridge (--db-bridge): frames are recorded directly in
+# externalServer's catCamBackend database, committed in groups.
+# BACKEND_DIR is the externalServer checkout holding catCamBackend/
+BACKEND_DIR = os.environ.get(
+    'CATCAM_BACKEND_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'externalServer')
+)
+DB_BRIDGE_BATCH_SIZE = 100
+DB_BRIDGE_BATCH_INTERVAL = 0.25
+DB_BRIDGE_QUEUE_SIZE = 10000
+
+# Interval between stats reports in the log (seconds)
+STATS_INTERVAL = 60.0
+
+# Ingest engine
+# "thread": one daemon thread per connection (original behaviour)
+# "asyncio": connections handled as coroutines with a concurrency limit
+INGEST_MODE = 'thread'
+LISTEN_BACKLOG = 128
+MAX_CONCURRENT_CLIENTS = 64
+
+# Framing
+RECV_BUFFER_SIZE = 4096
+HEADER_MAX_LENGTH = 256
+MAX_IMAGE_SIZE = 4 * 1024 * 1024
+MAX_METADATA_SIZE = 16 * 1024
+
+# Upload header versions
+#   legacy: "{frame},{img_len}\n" + JPEG
+#   v2:     "v2,{frame},{img_len},{meta_len}\n" + JPEG + JSON metadata
+PROTOCOL_V2 = 'v2'
+
+# Steps yielded by CatCamServer.upload_steps for an ingest engine to carry out
+READ_EXACT = 'read_exact'
+PROCESS = 'process'
+SEND = 'send'
+PERSIST = 'persist'
+
+# Persistent sessions: a connection may carry many uploads and is closed
+# by the server after this many seconds without a new header
+SESSION_IDLE_TIMEOUT = 60.0
+
 # Detection thresholds (placeholder for future CV implementation)
 DETECTION_CONFIDENCE_THRESHOLD = 0.7
 CONSECUTIVE_DETECTIONS_REQUIRED = 3
 
-# Global state
-device_states = {}
-recent_detections = {}
+# Device state store
+DEVICE_HISTORY_LENGTH = 5
+DEVICE_STATE_TTL = 24 * 60 * 60
+DEVICE_STATE_LOCK_STRIPES = 16
+DEVICE_STATE_FILE = 'device_state.json'
+DEVICE_STATE_SNAPSHOT_INTERVAL = 30.0
+
+def detect_cat(img_data, metadata):
+    """
+    Placeholder for computer vision cat detection
+    Works on the received JPEG bytes, the file may not be on disk yet
+    Returns: (detected: bool, confidence: float, bbox: dict or None)
+    """
+    # TODO: Implement actual CV detection here
+    # For now, this is a simple placeholder that simulates detection
+    
+    # Simulate detection logic based on motion sensor
+    motion_detected = metadata.get('sensor', {}).get('motion', False)
+    
+    if motion_detected:
+        # Simulate higher probability of detection when motion is present
+        # In real implementation, this would run actual CV model
+        confidence = 0.8
+        detected = True
+        bbox = {"x": 100, "y": 80, "width": 120, "height": 100}
+    else:
+        confidence = 0.1
+        detected = False
+        bbox = None
+    
+    return detected, confidence, bbox
+
+
+def _ignore_sigint():
+    # Ctrl-C is handled by the server process, which shuts the pool down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def detect_batch(frames):
+    """
+    Run detect_cat over a batch of (img_data, metadata) in a pool worker
+    Returns: list of (detection_result, inference_seconds)
+    """
+    results = []
+    for img_data, metadata in frames:
+        started = time.perf_counter()
+        result = detect_cat(img_data, metadata)
+        results.append((result, time.perf_counter() - started))
+    return results
+
+
+class DetectionExecutor:
+    """
+    Process-pool detection stage
+    detect() is called from connection threads and blocks until its frame's
+    result is ready. A batcher thread hands a batch to the pool as soon as a
+    worker is idle, taking up to max_batch of the frames queued by then and
+    optionally waiting up to max_wait for more. Frames that arrive while
+    every worker is busy form the next batch
+    """
+    _STOP = object()
+    
+    def __init__(self, log, workers=DETECTION_WORKERS, max_batch=DETECTION_MAX_BATCH,
+                 max_wait=DETECTION_MAX_WAIT):
+        self.log = log
+        self.workers = workers
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        # spawn so workers do not inherit the server's threads and locks
+        self.pool = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+            initializer=_ignore_sigint
+        )
+        # Start the workers now so the first uploads do not pay for it
+        self.pool.submit(detect_batch, []).result()
+        self.requests = queue.Queue()
+        # One slot per worker, held from submit until the batch completes
+        self.idle_workers = threading.Semaphore(workers)
+        self.stats_lock = threading.Lock()
+        self.frames = 0
+        self.batches = 0
+        self.errors = 0
+        self.inference_seconds = 0.0
+        self.latencies = deque(maxlen=DETECTION_LATENCY_SAMPLES)
+        
+        self.batcher = Thread(target=self._run, name="catcam-detect", daemon=True)
+        self.batcher.start()
+    
+    def detect(self, img_data, metadata):
+        """Queue a frame for detection and wait for its result"""
+        future = Future()
+        self.requests.put((img_data, metadata, future, time.monotonic()))
+        return future.result()
+    
+    def snapshot(self):
+        """Batch and latency figures for the stats report"""
+        with self.stats_lock:
+            latencies = sorted(self.latencies)
+            frames, batches, errors = self.frames, self.batches, self.errors
+            inference = self.inference_seconds
+        
+        def percentile(p):
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000
+        
+        return {
+            "workers": self.workers,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000,
+            "frames": frames,
+            "batches": batches,
+            "errors": errors,
+            "avg_batch_size": round(frames / batches, 2) if batches else 0.0,
+            "avg_inference_ms": round(inference / frames * 1000, 3) if frames else 0.0,
+            "latency_p50_ms": round(percentile(50), 3),
+            "latency_p95_ms": round(percentile(95), 3),
+        }
+    
+    def close(self):
+        """Finish queued frames and shut the pool down"""
+        self.requests.put(self._STOP)
+        self.batcher.join()
+        self.pool.shutdown(wait=True)
+    
+    def _next_batch(self):
+        item = self.requests.get()
+        if item is self._STOP:
+            return None
+        # Frames keep queueing while every worker is busy
+        self.idle_workers.acquire()
+        batch = [item]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    item = self.requests.get(timeout=remaining)
+                else:
+                    item = self.requests.get_nowait()
+            except queue.Empty:
+                break
+            if item is self._STOP:
+                # Put it back so the loop exits after this batch
+                self.requests.put(item)
+                break
+            batch.append(item)
+        return batch
+    
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            frames = [(img_data, metadata) for img_data, metadata, _, _ in batch]
+            try:
+                pool_future = self.pool.submit(detect_batch, frames)
+            except Exception as e:
+                self._fail(batch, e)
+                continue
+            pool_future.add_done_callback(lambda f, batch=batch: self._complete(batch, f))
+    
+    def _fail(self, batch, error):
+        self.idle_workers.release()
+        with self.stats_lock:
+            self.errors += len(batch)
+        for _, _, future, _ in batch:
+            future.set_exception(error)
+    
+    def _complete(self, batch, pool_future):
+        try:
+            results = pool_future.result()
+        except Exception as e:
+            self.log(f"ERROR: Detection batch failed: {e}")
+            self._fail(batch, e)
+            return
+        
+        self.idle_workers.release()
+        now = time.monotonic()
+        with self.stats_lock:
+            self.batches += 1
+            self.frames += len(batch)
+            for (_, _, _, queued_at), (_, inference) in zip(batch, results):
+                self.inference_seconds += inference
+                self.latencies.append(now - queued_at)
+        
+        for (_, _, future, _), (result, _) in zip(batch, results):
+            future.set_result(result)
+
+
+class BatchedLogWriter:
+    """
+    Queue-backed log writer
+    Callers never touch the file or stdout; a background thread writes lines
+    in batches, flushing every LOG_FLUSH_LINES lines or LOG_FLUSH_INTERVAL
+    seconds, and rotates the file once it reaches LOG_MAX_BYTES. Lines
+    written after close() go straight to the file
+    """
+    _STOP = object()
+    
+    def __init__(self, path=LOG_FILE, echo=True, max_queue=LOG_QUEUE_SIZE,
+                 flush_lines=LOG_FLUSH_LINES, flush_interval=LOG_FLUSH_INTERVAL,
+                 max_bytes=LOG_MAX_BYTES, backup_count=LOG_BACKUP_COUNT):
+        self.path = path
+        self.echo = echo
+        self.flush_lines = flush_lines
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.queue = queue.Queue(maxsize=max_queue)
+        # Guards dropped (bumped by every client thread) and closed
+        self.lock = threading.Lock()
+        self.dropped = 0
+        self.closed = False
+        
+        self.thread = Thread(target=self._run, name="catcam-log", daemon=True)
+        self.thread.start()
+    
+    def write(self, line):
+        """Queue a line without blocking; lines are dropped if the queue is full"""
+        if self.closed:
+            self._write_now(line)
+            return
+        try:
+            self.queue.put_nowait(line)
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+    
+    def close(self):
+        """Flush everything queued so far and stop the writer thread"""
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+        self.queue.put(self._STOP)
+        self.thread.join()
+        # Lines queued by a write() that raced with close()
+        while True:
+            try:
+                self._write_now(self.queue.get_nowait())
+            except queue.Empty:
+                break
+    
+    def _write_now(self, line):
+        # Late lines (shutdown messages from other threads) are rare, write them directly
+        with self.lock:
+            if self.echo:
+                print(line, flush=True)
+            with open(self.path, 'a') as f:
+                f.write(line + '\n')
+    
+    def _next_batch(self):
+        """Collect lines until the batch is full or the flush interval passes"""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.flush_lines:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is self._STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+    
+    def _rotate(self, f):
+        f.close()
+        for i in range(self.backup_count - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        return open(self.path, 'a')
+    
+    def _run(self):
+        f = open(self.path, 'a')
+        size = f.tell()
+        try:
+            stopping = False
+            while not stopping:
+                batch, stopping = self._next_batch()
+                with self.lock:
+                    dropped, self.dropped = self.dropped, 0
+                if dropped:
+                    batch.append(f"[log] {dropped} lines dropped, log queue full")
+                if not batch:
+                    continue
+                
+                text = '\n'.join(batch) + '\n'
+                if self.echo:
+                    sys.stdout.write(text)
+                    sys.stdout.flush()
+                f.write(text)
+                f.flush()
+                size += len(text.encode())
+                
+                if size >= self.max_bytes:
+                    f = self._rotate(f)
+                    size = 0
+        finally:
+            f.close()
+
+
+class StorageWriter:
+    """
+    Bounded write-behind queue for received frames
+    Jobs are written by a pool of worker threads. When the queue is full,
+    submit() blocks (backpressure) and the time spent waiting is recorded
+    """
+    _STOP = object()
+    
+    def __init__(self, log, workers=STORAGE_WORKERS, max_queue=STORAGE_QUEUE_SIZE,
+                 durability=STORAGE_DURABILITY, fsync_batch=STORAGE_FSYNC_BATCH,
+                 fsync_interval=STORAGE_FSYNC_INTERVAL):
+        self.log = log
+        self.durability = durability
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.stats_lock = threading.Lock()
+        self.stats = {
+            "submitted": 0,
+            "written": 0,
+            "failed": 0,
+            "fsyncs": 0,
+            "queue_full_events": 0,
+            "blocked_seconds": 0.0,
+            "max_queue_depth": 0,
+        }
+        self.last_full_log = 0.0
+        
+        self.workers = [
+            Thread(target=self._run, name=f"catcam-storage-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self.workers:
+            worker.start()
+    
+    def submit(self, image_path, img_data, metadata_path, metadata, on_saved=None):
+        """
+        Queue a frame and its metadata for writing; blocks while the queue is full
+        metadata_path may be None to skip the JSON file. on_saved(image_path)
+        is called from the worker once the frame is written
+        """
+        job = (image_path, img_data, metadata_path, metadata, on_saved)
+        try:
+            self.queue.put_nowait(job)
+        except queue.Full:
+            started = time.monotonic()
+            self.queue.put(job)
+            blocked = time.monotonic() - started
+            with self.stats_lock:
+                self.stats["queue_full_events"] += 1
+                self.stats["blocked_seconds"] += blocked
+                full_events = self.stats["queue_full_events"]
+                should_log = started - self.last_full_log >= STORAGE_FULL_LOG_INTERVAL
+                if should_log:
+                    self.last_full_log = started
+            if should_log:
+                self.log(f"WARNING: Storage queue full, upload blocked {blocked * 1000:.0f} ms "
+                         f"({full_events} times so far)")
+        
+        with self.stats_lock:
+            self.stats["submitted"] += 1
+            depth = self.queue.qsize()
+            if depth > self.stats["max_queue_depth"]:
+                self.stats["max_queue_depth"] = depth
+    
+    def snapshot(self):
+        """Return a copy of the counters plus the current queue depth"""
+        with self.stats_lock:
+            stats = dict(self.stats)
+        stats["queue_depth"] = self.queue.qsize()
+        return stats
+    
+    def close(self):
+        """Write everything still queued and stop the workers"""
+        for _ in self.workers:
+            self.queue.put(self._STOP)
+        for worker in self.workers:
+            worker.join()
+    
+    def _fsync(self, frames):
+        """Flush written frames and their directories to stable storage"""
+        dirs = set()
+        for path in (path for frame in frames for path in frame if path):
+            fd = os.open(path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+            dirs.add(os.path.dirname(path) or '.')
+        for directory in dirs:
+            fd = os.open(directory, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        with self.stats_lock:
+            self.stats["fsyncs"] += 1
+    
+    def _write(self, image_path, img_data, metadata_path, metadata):
+        with open(image_path, 'wb') as f:
+            f.write(img_data)
+            if self.durability == 'always':
+                f.flush()
+                os.fsync(f.fileno())
+        if metadata_path is None:
+            return
+        with open(metadata_path, 'w') as f:
+            json.dump(metadata, f, indent=2)
+            if self.durability == 'always':
+                f.flush()
+                os.fsync(f.fileno())
+    
+    def _run(self):
+        pending = []
+        last_sync = time.monotonic()
+        while True:
+            try:
+                timeout = self.fsync_interval if pending else None
+                job = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                job = None
+            
+            if job is not None and job is not self._STOP:
+                image_path, img_data, metadata_path, metadata, on_saved = job
+                try:
+                    self._write(image_path, img_data, metadata_path, metadata)
+                    with self.stats_lock:
+                        self.stats["written"] += 1
+                    self.log(f"Saved to {os.path.basename(image_path)}")
+                    if self.durability == 'batch':
+                        pending.append((image_path, metadata_path))
+                    if on_saved is not None:
+                        on_saved(image_path)
+                except Exception as e:
+                    with self.stats_lock:
+                        self.stats["failed"] += 1
+                    self.log(f"ERROR: Failed to save {image_path}: {e}")
+            
+            # Batched durability: one fsync pass per batch or interval
+            if pending and (job is None or job is self._STOP
+                            or len(pending) >= self.fsync_batch
+                            or time.monotonic() - last_sync >= self.fsync_interval):
+                try:
+                    self._fsync(pending)
+                except Exception as e:
+                    self.log(f"ERROR: fsync failed: {e}")
+                pending = []
+                last_sync = time.monotonic()
+            
+            if job is self._STOP:
+                return
+
+
+def camera_id_from_device(device_id):
+    """Numeric camera id from a device id such as "nicla-catcam-001" (-> 1), else None"""
+    match = re.search(r'(\d+)$', device_id or '')
+    return int(match.group(1)) if match else None
+
+
+def load_db_utils(backend_dir=BACKEND_DIR):
+    """
+    Load catCamBackend/db_utils.py from backend_dir without adding it to sys.path
+    db_utils reads CATCAM_IMAGES_DIR / CATCAM_METADATA_DIR when it is loaded
+    """
+    path = os.path.join(os.path.abspath(backend_dir), 'catCamBackend', 'db_utils.py')
+    if not os.path.exists(path):
+        raise ImportError(f"catCamBackend not found under {backend_dir} (set CATCAM_BACKEND_DIR)")
+    spec = importlib.util.spec_from_file_location('catcam_backend_db_utils', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class DbBridge:
+    """
+    Group-commit writer into the dashboard database
+    Rows are queued without blocking and inserted through
+    catCamBackend.db_utils.insert_metadata_many, one transaction per
+    DB_BRIDGE_BATCH_SIZE rows or DB_BRIDGE_BATCH_INTERVAL seconds
+    """
+    _STOP = object()
+    
+    def __init__(self, log, backend_dir=BACKEND_DIR, batch_size=DB_BRIDGE_BATCH_SIZE,
+                 batch_interval=DB_BRIDGE_BATCH_INTERVAL, max_queue=DB_BRIDGE_QUEUE_SIZE):
+        db_utils = load_db_utils(backend_dir)
+        
+        self.db_utils = db_utils
+        self.log = log
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.stats_lock = threading.Lock()
+        self.stats = {"queued": 0, "inserted": 0, "commits": 0, "dropped": 0, "failed": 0}
+        
+        db_utils.init_db()
+        self.images_dir = db_utils.IMAGES_DIR
+        
+        self.thread = Thread(target=self._run, name="catcam-db", daemon=True)
+        self.thread.start()
+    
+    def submit(self, row):
+        """Queue a metadata row; dropped (and counted) if the queue is full"""
+        try:
+            self.queue.put_nowait(row)
+        except queue.Full:
+            with self.stats_lock:
+                self.stats["dropped"] += 1
+            return
+        with self.stats_lock:
+            self.stats["queued"] += 1
+    
+    def snapshot(self):
+        with self.stats_lock:
+            stats = dict(self.stats)
+        stats["queue_depth"] = self.queue.qsize()
+        return stats
+    
+    def close(self):
+        """Commit everything queued and stop"""
+        self.queue.put(self._STOP)
+        self.thread.join()
+    
+    def _next_batch(self):
+        # Block for the first row, then gather more until the batch is full
+        # or batch_interval has passed since that first row
+        item = self.queue.get()
+        if item is self._STOP:
+            return [], True
+        batch = [item]
+        deadline = time.monotonic() + self.batch_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is self._STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+    
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = self._next_batch()
+            if not batch:
+                continue
+            try:
+                self.db_utils.insert_metadata_many(batch)
+            except Exception as e:
+                with self.stats_lock:
+                    self.stats["failed"] += len(batch)
+                self.log(f"ERROR: Database insert of {len(batch)} rows failed: {e}")
+                continue
+            with self.stats_lock:
+                self.stats["inserted"] += len(batch)
+                self.stats["commits"] += 1
+
+
+class FrameReader:
+    """
+    Buffered reader for the upload protocol on a blocking socket
+    The header line is parsed out of a fixed read buffer and the image
+    payload is received with recv_into straight into a preallocated bytearray
+    """
+    def __init__(self, sock, buffer_size=RECV_BUFFER_SIZE):
+        self.sock = sock
+        self.buffer = bytearray(buffer_size)
+        self.view = memoryview(self.buffer)
+        self.start = 0
+        self.end = 0
+    
+    def buffered(self):
+        return self.end - self.start
+    
+    def _fill(self):
+        """Read more bytes into the buffer, returns False on EOF"""
+        if self.start > 0:
+            # Move unread bytes to the front of the buffer
+            pending = self.buffered()
+            self.buffer[:pending] = self.view[self.start:self.end]
+            self.start, self.end = 0, pending
+        if self.end == len(self.buffer):
+            return False
+        received = self.sock.recv_into(self.view[self.end:])
+        if not received:
+            return False
+        self.end += received
+        return True
+    
+    def read_line(self, max_length=HEADER_MAX_LENGTH):
+        """
+        Read up to the next newline
+        Returns: line bytes without the newline, or whatever was read before EOF
+        """
+        while True:
+            idx = self.buffer.find(b'\n', self.start, self.end)
+            if idx >= 0:
+                line = bytes(self.view[self.start:idx])
+                self.start = idx + 1
+                return line
+            if self.buffered() >= max_length:
+                raise ValueError(f"Header exceeds {max_length} bytes")
+            if not self._fill():
+                line = bytes(self.view[self.start:self.end])
+                self.start = self.end
+                return line
+    
+    def read_exact(self, size):
+        """
+        Receive exactly size bytes into a new preallocated bytearray
+        Returns: (data: bytearray, received: int); received < size on EOF
+        """
+        data = bytearray(size)
+        target = memoryview(data)
+        
+        # Drain anything already sitting in the read buffer
+        received = min(size, self.buffered())
+        target[:received] = self.view[self.start:self.start + received]
+        self.start += received
+        
+        while received < size:
+            n = self.sock.recv_into(target[received:], size - received)
+            if not n:
+                break
+            received += n
+        
+        return data, received
+
+
+class DeviceState:
+    """Mode and recent detection history of one device"""
+    __slots__ = ('device_id', 'history', 'last_seen', 'mode', 'frame_count',
+                 'last_detection', 'last_response', 'evicted')
+    
+    def __init__(self, device_id, history=(), last_seen=None, mode=None,
+                 frame_count=None, last_detection=False):
+        self.device_id = device_id
+        self.history = deque(history, maxlen=DEVICE_HISTORY_LENGTH)
+        self.last_seen = last_seen if last_seen is not None else time.time()
+        self.mode = mode
+        self.frame_count = frame_count
+        self.last_detection = last_detection
+        # Reply to frame_count, kept in memory only to answer a resent frame
+        self.last_response = None
+        self.evicted = False
+    
+    def to_dict(self):
+        return {
+            "history": [int(d) for d in self.history],
+            "last_seen": self.last_seen,
+            "mode": self.mode,
+            "frame_count": self.frame_count,
+            "last_detection": self.last_detection,
+        }
+
+
+class DeviceStateStore:
+    """
+    Thread-safe per-device state
+    Devices are spread over lock stripes so uploads from different devices
+    rarely contend. Each device keeps a fixed-size ring of recent detections.
+    Devices not seen for ttl seconds are evicted, and the store can be
+    snapshotted to disk so alert/active hysteresis survives a restart
+    """
+    def __init__(self, ttl=DEVICE_STATE_TTL, stripes=DEVICE_STATE_LOCK_STRIPES):
+        self.ttl = ttl
+        self.locks = [threading.Lock() for _ in range(stripes)]
+        self.shards = [{} for _ in range(stripes)]
+    
+    def _stripe(self, device_id):
+        return hash(device_id) % len(self.locks)
+    
+    def __len__(self):
+        return sum(len(shard) for shard in self.shards)
+    
+    def get(self, device_id):
+        """Return the state for device_id, creating it if needed"""
+        i = self._stripe(device_id)
+        with self.locks[i]:
+            state = self.shards[i].get(device_id)
+            if state is None:
+                state = self.shards[i][device_id] = DeviceState(device_id)
+            return state
+    
+    def record_detection(self, state, detected):
+        """
+        Add a detection to the device's history
+        Returns: number of positive detections in the history
+        """
+        with self.locks[self._stripe(state.device_id)]:
+            state.history.append(bool(detected))
+            state.last_seen = time.time()
+            return sum(state.history)
+    
+    def update(self, state, mode, frame_count, last_detection, response=None):
+        with self.locks[self._stripe(state.device_id)]:
+            state.mode = mode
+            state.frame_count = frame_count
+            state.last_detection = last_detection
+            state.last_response = response
+            state.last_seen = time.time()
+    
+    def evict_stale(self, now=None):
+        """Drop devices not seen for ttl seconds, returns how many were dropped"""
+        cutoff = (now if now is not None else time.time()) - self.ttl
+        evicted = 0
+        for lock, shard in zip(self.locks, self.shards):
+            with lock:
+                stale = [d for d, state in shard.items() if state.last_seen < cutoff]
+                for device_id in stale:
+                    shard.pop(device_id).evicted = True
+                evicted += len(stale)
+        return evicted
+    
+    def snapshot(self):
+        """Return {device_id: state dict} for every device"""
+        devices = {}
+        for lock, shard in zip(self.locks, self.shards):
+            with lock:
+                for device_id, state in shard.items():
+                    devices[device_id] = state.to_dict()
+        return devices
+    
+    def save(self, path):
+        """Write a snapshot atomically (temp file + rename)"""
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({"saved_at": time.time(), "devices": self.snapshot()}, f)
+        os.replace(tmp_path, path)
+    
+    def load(self, path):
+        """Restore devices from a snapshot, skipping ones past the TTL"""
+        if not os.path.exists(path):
+            return 0
+        with open(path) as f:
+            data = json.load(f)
+        cutoff = time.time() - self.ttl
+        loaded = 0
+        for device_id, entry in data.get("devices", {}).items():
+            if entry.get("last_seen", 0) < cutoff:
+                continue
+            state = DeviceState(
+                device_id,
+                history=(bool(d) for d in entry.get("history", [])),
+                last_seen=entry["last_seen"],
+                mode=entry.get("mode"),
+                frame_count=entry.get("frame_count"),
+                last_detection=entry.get("last_detection", False),
+            )
+            i = self._stripe(device_id)
+            with self.locks[i]:
+                self.shards[i][device_id] = state
+            loaded += 1
+        return loaded
+
+
+class ClientSession:
+    """Per-connection state kept across the frames of a persistent session"""
+    def __init__(self, client_addr):
+        self.client_addr = client_addr
+        self.frames = 0
+        self.device = None
+    
+    def device_for(self, devices, device_id):
+        """State for device_id, looked up once per session unless evicted"""
+        device = self.device
+        if device is None or device.device_id != device_id or device.evicted:
+            device = self.device = devices.get(device_id)
+        return device
+
 
 class CatCamServer:
-    def __init__(self):
+    def __init__(self, mode=INGEST_MODE, max_clients=MAX_CONCURRENT_CLIENTS, backlog=LISTEN_BACKLOG,
+                 storage_workers=STORAGE_WORKERS, durability=STORAGE_DURABILITY,
+                 detect_workers=DETECTION_WORKERS, detect_batch=DETECTION_MAX_BATCH,
+                 detect_wait=DETECTION_MAX_WAIT, db_bridge=False, backend_dir=BACKEND_DIR):
         self.running = False
         self.frame_count = 0
+        self.mode = mode
+        self.max_clients = max_clients
+        self.backlog = backlog
+        self.log_writer = BatchedLogWriter()
+        self.storage = StorageWriter(self.log, workers=storage_workers, durability=durability)
+        self.detector = None
+        if detect_workers > 0:
+            self.detector = DetectionExecutor(
+                self.log, workers=detect_workers, max_batch=detect_batch, max_wait=detect_wait
+            )
+        self.db_bridge = DbBridge(self.log, backend_dir=backend_dir) if db_bridge else None
+        self.save_dir = self.db_bridge.images_dir if self.db_bridge else SAVE_DIR
+        self.last_stats_time = time.monotonic()
+        self.last_snapshot_time = time.monotonic()
+        
+        self.devices = DeviceStateStore()
+        try:
+            restored = self.devices.load(DEVICE_STATE_FILE)
+        except Exception as e:
+            restored = 0
+            self.log(f"Could not restore device state from {DEVICE_STATE_FILE}: {e}")
         
         # Create directories
-        os.makedirs(SAVE_DIR, exist_ok=True)
+        os.makedirs(self.save_dir, exist_ok=True)
         os.makedirs(METADATA_DIR, exist_ok=True)
         
-        self.log(f"Server initialized. Images will be saved to: {SAVE_DIR}")
+        self.log(f"Server initialized. Images will be saved to: {self.save_dir}")
         self.log(f"Server IP: {HOST}, Port: {PORT}")
+        self.log(f"Restored state for {restored} device(s) from {DEVICE_STATE_FILE}")
+        self.log(f"Ingest mode: {self.mode} (max clients: {self.max_clients}, backlog: {self.backlog})")
+        self.log(f"Storage: {storage_workers} writer(s), durability: {durability}")
+        if self.db_bridge is not None:
+            self.log(f"Database bridge: {self.db_bridge.db_utils.DB_FILE} "
+                     f"(commit every {DB_BRIDGE_BATCH_SIZE} frames or {DB_BRIDGE_BATCH_INTERVAL * 1000:.0f} ms)")
+        if self.detector is not None:
+            self.log(f"Detection: {detect_workers} process(es), batch <= {detect_batch}, "
+                     f"wait <= {detect_wait * 1000:.0f} ms")
+        else:
+            self.log("Detection: inline")
     
     def log(self, message):
-        """Log message to console and file"""
+        """Queue message for the console and log file without blocking"""
         timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        log_message = f"[{timestamp}] {message}"
-        print(log_message)
-        
-        with open(LOG_FILE, 'a') as f:
-            f.write(log_message + '\n')
+        self.log_writer.write(f"[{timestamp}] {message}")
     
-    def process_cv_detection(self, image_path, metadata):
+    def process_cv_detection(self, img_data, metadata):
         """
-        Placeholder for computer vision cat detection
+        Run cat detection on the received JPEG bytes
+        Uses the detection process pool when enabled, otherwise runs inline
         Returns: (detected: bool, confidence: float, bbox: dict or None)
         """
-        # TODO: Implement actual CV detection here
-        # For now, this is a simple placeholder that simulates detection
-        
-        # Simulate detection logic based on motion sensor
-        motion_detected = metadata.get('sensor', {}).get('motion', False)
-        
-        if motion_detected:
-            # Simulate higher probability of detection when motion is present
-            # In real implementation, this would run actual CV model
-            confidence = 0.8
-            detected = True
-            bbox = {"x": 100, "y": 80, "width": 120, "height": 100}
-        else:
-            confidence = 0.1
-            detected = False
-            bbox = None
-        
-        return detected, confidence, bbox
+        if self.detector is not None:
+            return self.detector.detect(img_data, metadata)
+        return detect_cat(img_data, metadata)
     
-    def determine_next_mode(self, device_id, detection_result, metadata):
+    def determine_next_mode(self, device_id, detection_result, metadata, device=None):
         """
         Determine what mode the device should be in based on detection results
         Returns: (next_mode: str, action: str, message: str)
@@ -77,16 +956,12 @@ class CatCamServer:
         current_mode = metadata.get('mode', 'standby')
         
         # Track detection history for this device
-        if device_id not in recent_detections:
-            recent_detections[device_id] = []
+        if device is None:
+            device = self.devices.get(device_id)
         
-        # Add current detection to history (keep last 5)
-        recent_detections[device_id].append(detected)
-        if len(recent_detections[device_id]) > 5:
-            recent_detections[device_id].pop(0)
-        
-        # Count recent positive detections
-        recent_positive = sum(recent_detections[device_id])
+        # Add current detection to history (keeps the last DEVICE_HISTORY_LENGTH)
+        # and count recent positive detections
+        recent_positive = self.devices.record_detection(device, detected)
         
         # Decision logic
         if current_mode == "standby":
@@ -112,128 +987,297 @@ class CatCamServer:
         
         return "standby", "none", "Default response"
     
-    def handle_client(self, client_sock, client_addr):
-        """Handle incoming image upload from device"""
+    def parse_header(self, header_bytes):
+        """
+        Parse a legacy "{frame},{size}" or "v2,{frame},{size},{meta_size}" header
+        Returns: (frame_num: str, img_size: int, meta_size: int) or None if malformed
+        """
         try:
-            # Receive metadata line
-            metadata_bytes = b''
-            while True:
-                byte = client_sock.recv(1)
-                if not byte or byte == b'\n':
-                    break
-                metadata_bytes += byte
-            
-            # Parse metadata
-            meta_str = metadata_bytes.decode('utf-8').strip()
+            meta_str = header_bytes.decode('utf-8').strip()
             parts = meta_str.split(',')
             
-            if len(parts) < 2:
-                self.log(f"Invalid metadata from {client_addr}")
-                client_sock.close()
-                return
-            
-            frame_num = parts[0]
-            img_size = int(parts[1])
-            
-            self.log(f"Receiving frame {frame_num}: {img_size} bytes from {client_addr[0]}")
-            
-            # Receive image data
-            img_data = b''
-            remaining = img_size
+            if parts[0] == PROTOCOL_V2:
+                if len(parts) < 4:
+                    return None
+                frame_num, img_size, meta_size = parts[1], int(parts[2]), int(parts[3])
+            else:
+                # Legacy header carries no metadata
+                if len(parts) < 2:
+                    return None
+                frame_num, img_size, meta_size = parts[0], int(parts[1]), 0
+        except ValueError:
+            # Not UTF-8 or a size that is not a number
+            return None
+        
+        if img_size < 0 or img_size > MAX_IMAGE_SIZE:
+            return None
+        if meta_size < 0 or meta_size > MAX_METADATA_SIZE:
+            return None
+        
+        return frame_num, img_size, meta_size
+    
+    def parse_extended_metadata(self, frame_num, json_data):
+        """Decode the JSON metadata sent after the image, if any"""
+        try:
+            if json_data:
+                return json.loads(bytes(json_data).decode())
+        except Exception as e:
+            self.log(f"Invalid JSON metadata for frame {frame_num}: {e}")
+        return self.create_basic_metadata(frame_num)
+    
+    def process_frame(self, frame_num, img_data, metadata, session=None):
+        """
+        Run detection on a received frame and decide the device's next mode
+        The frame is not written here, see persist_frame
+        Returns: response dict to send back to the device; a resent frame
+        gets its earlier reply again, marked "duplicate"
+        """
+        device_id = metadata.get('device_id', 'unknown')
+        if session:
+            device = session.device_for(self.devices, device_id)
+        else:
+            device = self.devices.get(device_id)
+        
+        # A camera that got no reply resends the same frame; answer it again
+        # without detecting, storing or counting it twice
+        previous = device.last_response
+        if device_id != 'unknown' and previous is not None and device.frame_count == frame_num:
+            self.log(f"Duplicate frame {frame_num} from {device_id}, resending its reply")
+            return dict(previous, duplicate=True)
+        
+        self.frame_count += 1
+        if session:
+            session.frames += 1
+        
+        # Process CV detection
+        detection_result = self.process_cv_detection(img_data, metadata)
+        detected, confidence, bbox = detection_result
+        
+        # Determine next mode
+        next_mode, action, message = self.determine_next_mode(
+            device_id, detection_result, metadata, device
+        )
+        
+        # Log detection result
+        if detected:
+            self.log(f" Cat detected! Confidence: {confidence:.2f}, Next mode: {next_mode}")
+        else:
+            self.log(f"  No cat detected. Next mode: {next_mode}")
+        
+        response = {
+            "status": "ok",
+            "frame": frame_num,
+            "next_mode": next_mode,
+            "action": action,
+            "message": message,
+            "detection": {
+                "cat_detected": detected,
+                "confidence": confidence,
+                "bbox": bbox
+            }
+        }
+        
+        # Update device state
+        self.devices.update(device, next_mode, frame_num, detected, response)
+        
+        return response
+    
+    def persist_frame(self, frame_num, img_data, metadata, response):
+        """
+        Queue a frame and its metadata for the write-behind storage workers
+        With the database bridge the metadata goes into the dashboard DB
+        instead of a JSON file, once the image has been written
+        """
+        timestamp_str = datetime.now().strftime('%Y%m%d_%H%M%S')
+        filename = f"frame_{frame_num.zfill(4)}_{timestamp_str}"
+        device_id = metadata.get('device_id', 'unknown')
+        if device_id != 'unknown':
+            # Cameras share frame numbers, keep their files apart
+            filename = f"{re.sub(r'[^A-Za-z0-9_.-]', '_', device_id)}_{filename}"
+        image_path = os.path.join(self.save_dir, filename + ".jpg")
+        
+        if self.db_bridge is None:
+            self.storage.submit(
+                image_path, img_data,
+                os.path.join(METADATA_DIR, filename + ".json"), metadata
+            )
+            return
+        
+        row = {
+            "filename": filename + ".jpg",
+            "cameraId": camera_id_from_device(metadata.get('device_id')),
+            "file_type": "jpg",
+            "confidence": response["detection"]["confidence"],
+        }
+        self.storage.submit(image_path, img_data, None, metadata,
+                            on_saved=lambda _path: self.db_bridge.submit(row))
+    
+    def upload_steps(self, header_bytes, session):
+        """
+        Protocol for one upload after its header line, shared by both ingest
+        engines. Yields (step, arg) I/O requests and is sent their results:
+            (READ_EXACT, size)  -> the bytes received, shorter on EOF
+            (PROCESS, args)     -> response dict from process_frame(*args)
+            (SEND, data)        -> True if the reply reached the device
+            (PERSIST, args)     -> persist_frame(*args) has run
+        Returns: True to wait for the session's next frame, False to close it
+        """
+        client_addr = session.client_addr
+        header = self.parse_header(header_bytes)
+        if header is None:
+            self.log(f"Invalid metadata from {client_addr}")
+            return False
+        
+        frame_num, img_size, meta_size = header
+        
+        self.log(f"Receiving frame {frame_num}: {img_size} bytes from {client_addr[0]}")
+        
+        # Receive image data into a buffer sized from the header
+        img_data = yield READ_EXACT, img_size
+        
+        # Verify we got all data
+        if len(img_data) != img_size:
+            self.log(f"ERROR: Expected {img_size} bytes, got {len(img_data)} bytes")
+            return False
+        
+        # Receive JSON metadata announced by a v2 header
+        json_data = b''
+        if meta_size:
+            json_data = yield READ_EXACT, meta_size
+            if len(json_data) != meta_size:
+                self.log(f"ERROR: Expected {meta_size} metadata bytes, got {len(json_data)} bytes")
+                return False
+        metadata = self.parse_extended_metadata(frame_num, json_data)
+        
+        response = yield PROCESS, (frame_num, img_data, metadata, session)
+        
+        # Send response back to device
+        sent = yield SEND, (json.dumps(response) + '\n').encode()
+        
+        # Persist after replying so disk latency does not gate the camera;
+        # a duplicate was stored the first time
+        if not response.get("duplicate"):
+            yield PERSIST, (frame_num, img_data, metadata, response)
+        
+        # A failed send means the device went away, nothing more to read
+        return sent
+    
+    def handle_client(self, client_sock, client_addr):
+        """Handle a device connection carrying one or more image uploads"""
+        session = ClientSession(client_addr)
+        try:
+            reader = FrameReader(client_sock)
+            client_sock.settimeout(SESSION_IDLE_TIMEOUT)
             
-            while remaining > 0:
-                chunk = client_sock.recv(min(8192, remaining))
-                if not chunk:
+            while self.running:
+                # Receive metadata line; EOF means the device ended the session
+                try:
+                    header_bytes = reader.read_line()
+                except socket.timeout:
+                    self.log(f"Session from {client_addr[0]} idle, closing after {session.frames} frames")
+                    break
+                if not header_bytes:
+                    break
+                
+                if not self.run_upload(self.upload_steps(header_bytes, session), reader, client_sock):
                     break
-                img_data += chunk
-                remaining -= len(chunk)
-            
-            # Verify we got all data
-            if len(img_data) != img_size:
-                self.log(f"ERROR: Expected {img_size} bytes, got {len(img_data)} bytes")
-                client_sock.close()
-                return
-            
-            # Save image
-            timestamp_str = datetime.now().strftime('%Y%m%d_%H%M%S')
-            filename = f"frame_{frame_num.zfill(4)}_{timestamp_str}.jpg"
-            filepath = os.path.join(SAVE_DIR, filename)
-            
-            with open(filepath, 'wb') as f:
-                f.write(img_data)
-            
-            self.frame_count += 1
-            self.log(f"Saved to {filename}")
             
-            # Try to receive JSON metadata if sent (optional extended protocol)
-            try:
-                client_sock.settimeout(0.5)
-                json_data = client_sock.recv(2048)
-                if json_data:
-                    metadata = json.loads(json_data.decode())
+        except Exception as e:
+            self.log(f"Error handling client: {e}")
+        finally:
+            client_sock.close()
+    
+    def run_upload(self, steps, reader, client_sock):
+        """Carry out upload_steps on a blocking socket"""
+        result = None
+        try:
+            while True:
+                step, arg = steps.send(result)
+                if step == READ_EXACT:
+                    data, received = reader.read_exact(arg)
+                    result = data if received == arg else data[:received]
+                elif step == PROCESS:
+                    result = self.process_frame(*arg)
+                elif step == SEND:
+                    try:
+                        client_sock.sendall(arg)
+                    except Exception:
+                        result = False
+                    else:
+                        result = True
                 else:
-                    metadata = self.create_basic_metadata(frame_num)
-            except:
-                metadata = self.create_basic_metadata(frame_num)
-            
-            # Save metadata
-            metadata_file = os.path.join(METADATA_DIR, f"frame_{frame_num.zfill(4)}_{timestamp_str}.json")
-            with open(metadata_file, 'w') as f:
-                json.dump(metadata, f, indent=2)
-            
-            # Process CV detection
-            detection_result = self.process_cv_detection(filepath, metadata)
-            detected, confidence, bbox = detection_result
-            
-            device_id = metadata.get('device_id', 'unknown')
-            
-            # Determine next mode
-            next_mode, action, message = self.determine_next_mode(
-                device_id, detection_result, metadata
-            )
-            
-            # Prepare response
-            response = {
-                "status": "ok",
-                "frame": frame_num,
-                "next_mode": next_mode,
-                "action": action,
-                "message": message,
-                "detection": {
-                    "cat_detected": detected,
-                    "confidence": confidence,
-                    "bbox": bbox
-                }
-            }
-            
-            # Send response back to device
-            response_json = json.dumps(response) + '\n'
-            try:
-                client_sock.send(response_json.encode())
-            except:
-                pass  # Device may not be waiting for response
-            
-            # Log detection result
-            if detected:
-                self.log(f" Cat detected! Confidence: {confidence:.2f}, Next mode: {next_mode}")
-            else:
-                self.log(f"  No cat detected. Next mode: {next_mode}")
-            
-            # Update device state
-            device_states[device_id] = {
-                "last_seen": datetime.now().isoformat(),
-                "mode": next_mode,
-                "frame_count": frame_num,
-                "last_detection": detected
-            }
+                    result = self.persist_frame(*arg)
+        except StopIteration as done:
+            return done.value
+    
+    async def handle_client_async(self, reader, writer):
+        """Coroutine version of handle_client used by the asyncio ingest engine"""
+        client_addr = writer.get_extra_info('peername') or ('unknown', 0)
+        session = ClientSession(client_addr)
+        
+        try:
+            while self.running:
+                # Receive metadata line; EOF means the device ended the session
+                try:
+                    header_bytes = await asyncio.wait_for(reader.readline(), SESSION_IDLE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    self.log(f"Session from {client_addr[0]} idle, closing after {session.frames} frames")
+                    break
+                if not header_bytes:
+                    break
+                
+                if not await self.run_upload_async(self.upload_steps(header_bytes, session), reader, writer):
+                    break
             
         except Exception as e:
             self.log(f"Error handling client: {e}")
         finally:
-            client_sock.close()
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+    
+    async def run_upload_async(self, steps, reader, writer):
+        """Carry out upload_steps on asyncio streams"""
+        loop = asyncio.get_running_loop()
+        # Bound the number of uploads being received and processed at once;
+        # idle sessions do not hold a slot
+        await self.client_slots.acquire()
+        holding_slot = True
+        result = None
+        try:
+            while True:
+                step, arg = steps.send(result)
+                if step == READ_EXACT:
+                    try:
+                        result = await reader.readexactly(arg)
+                    except asyncio.IncompleteReadError as e:
+                        result = e.partial
+                elif step == PROCESS:
+                    # Detection is blocking, keep it off the event loop
+                    result = await loop.run_in_executor(None, self.process_frame, *arg)
+                elif step == SEND:
+                    self.client_slots.release()
+                    holding_slot = False
+                    try:
+                        writer.write(arg)
+                        await writer.drain()
+                    except Exception:
+                        result = False
+                    else:
+                        result = True
+                else:
+                    # May wait if the storage queue is full
+                    result = await loop.run_in_executor(None, self.persist_frame, *arg)
+        except StopIteration as done:
+            return done.value
+        finally:
+            if holding_slot:
+                self.client_slots.release()
     
     def create_basic_metadata(self, frame_num):
-        """Create basic metadata when extended metadata is not available"""
+        """Create basic metadata for legacy uploads that carry no metadata"""
         return {
             "device_id": "unknown",
             "timestamp_utc": datetime.now().isoformat(),
@@ -246,23 +1290,99 @@ class CatCamServer:
             }
         }
     
+    def log_stats(self):
+        """Log storage and detection figures"""
+        self.log(f"Storage stats: {json.dumps(self.storage.snapshot())}")
+        if self.detector is not None:
+            self.log(f"Detection stats: {json.dumps(self.detector.snapshot())}")
+        if self.db_bridge is not None:
+            self.log(f"Database stats: {json.dumps(self.db_bridge.snapshot())}")
+    
+    def save_device_state(self):
+        """Evict stale devices and snapshot the rest to DEVICE_STATE_FILE"""
+        evicted = self.devices.evict_stale()
+        if evicted:
+            self.log(f"Evicted {evicted} stale device(s), {len(self.devices)} tracked")
+        try:
+            self.devices.save(DEVICE_STATE_FILE)
+        except Exception as e:
+            self.log(f"ERROR: Could not save device state: {e}")
+    
+    def housekeeping(self):
+        """Periodic stats reports and device state snapshots"""
+        now = time.monotonic()
+        if now - self.last_stats_time >= STATS_INTERVAL:
+            self.last_stats_time = now
+            self.log_stats()
+        if now - self.last_snapshot_time >= DEVICE_STATE_SNAPSHOT_INTERVAL:
+            self.last_snapshot_time = now
+            self.save_device_state()
+    
+    def log_banner(self):
+        self.log("=" * 60)
+        self.log("CatCam Server Started")
+        self.log(f"Listening on {HOST}:{PORT}")
+        self.log("Waiting for images from Nicla Vision...")
+        self.log("=" * 60)
+    
     def start(self):
-        """Start the server"""
+        """Start the server using the configured ingest engine"""
+        try:
+            if self.mode == 'asyncio':
+                self.start_async()
+            else:
+                self.start_threaded()
+        finally:
+            if self.detector is not None:
+                self.detector.close()
+            self.storage.close()
+            if self.db_bridge is not None:
+                self.db_bridge.close()
+            self.save_device_state()
+            self.log_stats()
+            self.log_writer.close()
+    
+    def start_async(self):
+        """Start the asyncio ingest engine"""
+        self.running = True
+        
+        try:
+            asyncio.run(self.serve_async())
+        except KeyboardInterrupt:
+            self.log("\nShutdown requested...")
+        finally:
+            self.log(f"Server stopped. Received {self.frame_count} images total")
+    
+    async def serve_async(self):
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=self.max_clients))
+        self.client_slots = asyncio.Semaphore(self.max_clients)
+        
+        server = await asyncio.start_server(
+            self.handle_client_async, HOST, PORT,
+            backlog=self.backlog, reuse_address=True
+        )
+        self.log_banner()
+        
+        async with server:
+            while self.running:
+                await asyncio.sleep(1.0)
+                await loop.run_in_executor(None, self.housekeeping)
+    
+    def start_threaded(self):
+        """Start the thread-per-connection ingest engine"""
         self.running = True
         
         server_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         server_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
         server_sock.bind((HOST, PORT))
-        server_sock.listen(5)
+        server_sock.listen(self.backlog)
         
-        self.log("=" * 60)
-        self.log("CatCam Server Started")
-        self.log(f"Listening on {HOST}:{PORT}")
-        self.log("Waiting for images from Nicla Vision...")
-        self.log("=" * 60)
+        self.log_banner()
         
         try:
             while self.running:
+                self.housekeeping()
                 try:
                     server_sock.settimeout(1.0)
                     client_sock, client_addr = server_sock.accept()
@@ -291,7 +1411,34 @@ class CatCamServer:
         self.running = False
 
 def main():
-    server = CatCamServer()
+    parser = argparse.ArgumentParser(description="CatCam image ingest server")
+    parser.add_argument('--mode', choices=['thread', 'asyncio'], default=INGEST_MODE,
+                        help="Ingest engine to use")
+    parser.add_argument('--max-clients', type=int, default=MAX_CONCURRENT_CLIENTS,
+                        help="Max uploads processed concurrently (asyncio mode)")
+    parser.add_argument('--backlog', type=int, default=LISTEN_BACKLOG,
+                        help="Listen socket accept backlog")
+    parser.add_argument('--storage-workers', type=int, default=STORAGE_WORKERS,
+                        help="Threads writing frames to disk")
+    parser.add_argument('--durability', choices=['none', 'batch', 'always'], default=STORAGE_DURABILITY,
+                        help="fsync policy for saved frames")
+    parser.add_argument('--detect-workers', type=int, default=DETECTION_WORKERS,
+                        help="Detection worker processes (0 runs detection inline)")
+    parser.add_argument('--detect-batch', type=int, default=DETECTION_MAX_BATCH,
+                        help="Max frames per detection batch")
+    parser.add_argument('--detect-wait-ms', type=float, default=DETECTION_MAX_WAIT * 1000,
+                        help="Extra time a batch waits to fill once a worker is idle")
+    parser.add_argument('--db-bridge', action='store_true',
+                        help="Record frames in the catCamBackend database instead of metadata/*.json")
+    parser.add_argument('--backend-dir', default=BACKEND_DIR,
+                        help="externalServer directory holding catCamBackend (--db-bridge)")
+    args = parser.parse_args()
+    
+    server = CatCamServer(mode=args.mode, max_clients=args.max_clients, backlog=args.backlog,
+                          storage_workers=args.storage_workers, durability=args.durability,
+                          detect_workers=args.detect_workers, detect_batch=args.detect_batch,
+                          detect_wait=args.detect_wait_ms / 1000, db_bridge=args.db_bridge,
+                          backend_dir=args.backend_dir)
     
     try:
         server.start()
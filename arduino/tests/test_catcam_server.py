@@ -0,0 +1,464 @@
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+
+import pytest
+
+import catcam_server
+from catcam_server import (
+    DEVICE_HISTORY_LENGTH, MAX_IMAGE_SIZE, MAX_METADATA_SIZE, CatCamServer, ClientSession,
+    BatchedLogWriter, DbBridge, DetectionExecutor, DeviceStateStore, FrameReader, StorageWriter,
+    camera_id_from_device, detect_cat,
+)
+
+
+@pytest.fixture
+def pair():
+    server_sock, device_sock = socket.socketpair()
+    server_sock.settimeout(5)
+    yield server_sock, device_sock
+    server_sock.close()
+    device_sock.close()
+
+
+def test_reader_splits_header_and_payload(pair):
+    server_sock, device_sock = pair
+    device_sock.sendall(b"v2,1,5,2\nhello{}12,3\nabc")
+    reader = FrameReader(server_sock)
+
+    assert reader.read_line() == b"v2,1,5,2"
+    data, received = reader.read_exact(5)
+    assert (bytes(data), received) == (b"hello", 5)
+    data, received = reader.read_exact(2)
+    assert bytes(data) == b"{}"
+    assert reader.read_line() == b"12,3"
+    assert bytes(reader.read_exact(3)[0]) == b"abc"
+
+
+def test_reader_receives_payload_beyond_buffer(pair):
+    server_sock, device_sock = pair
+    payload = bytes(range(256)) * 64
+    reader = FrameReader(server_sock, buffer_size=64)
+    sender = threading.Thread(target=device_sock.sendall, args=(b"1,16384\n" + payload,))
+    sender.start()
+
+    assert reader.read_line() == b"1,16384"
+    data, received = reader.read_exact(len(payload))
+    sender.join()
+    assert received == len(payload) and bytes(data) == payload
+
+
+def test_reader_compacts_buffer_between_lines(pair):
+    server_sock, device_sock = pair
+    reader = FrameReader(server_sock, buffer_size=16)
+    device_sock.sendall(b"aaaaaaaaaa\n")
+    assert reader.read_line() == b"aaaaaaaaaa"
+    # Only 5 bytes of space left at the end; the next line needs the front of the buffer
+    device_sock.sendall(b"bbbbbbbbbbbb\n")
+    assert reader.read_line() == b"bbbbbbbbbbbb"
+    assert reader.start == 13 and reader.buffered() == 0
+
+
+def test_reader_rejects_overlong_header(pair):
+    server_sock, device_sock = pair
+    device_sock.sendall(b"x" * 40)
+    reader = FrameReader(server_sock)
+    with pytest.raises(ValueError):
+        reader.read_line(max_length=32)
+
+
+def test_reader_short_reads_at_eof(pair):
+    server_sock, device_sock = pair
+    device_sock.sendall(b"7,100\npartial")
+    device_sock.shutdown(socket.SHUT_WR)
+    reader = FrameReader(server_sock)
+
+    assert reader.read_line() == b"7,100"
+    data, received = reader.read_exact(100)
+    assert received == 7 and bytes(data[:received]) == b"partial"
+    assert reader.read_line() == b""
+
+
+def test_reader_returns_unterminated_line_at_eof(pair):
+    server_sock, device_sock = pair
+    device_sock.sendall(b"3,10")
+    device_sock.shutdown(socket.SHUT_WR)
+    assert FrameReader(server_sock).read_line() == b"3,10"
+
+
+def parse_header(header_bytes):
+    # parse_header does not touch server state, so skip __init__ (log writer, pools, dirs)
+    return CatCamServer.__new__(CatCamServer).parse_header(header_bytes)
+
+
+def test_parse_header_v2_and_legacy():
+    assert parse_header(b"v2,17,2048,64") == ("17", 2048, 64)
+    assert parse_header(b"17,2048\r") == ("17", 2048, 0)
+    # A legacy frame number is not mistaken for the v2 marker
+    assert parse_header(b"v2x,5") == ("v2x", 5, 0)
+
+
+@pytest.mark.parametrize("header", [
+    b"v2,17,2048",
+    b"17",
+    b"",
+    b"17,abc",
+    b"v2,17,2048,lots",
+    b"\xff\xfe,1",
+    b"17,-1",
+    b"v2,17,10,-1",
+    f"17,{MAX_IMAGE_SIZE + 1}".encode(),
+    f"v2,17,10,{MAX_METADATA_SIZE + 1}".encode(),
+])
+def test_parse_header_rejects_malformed(header):
+    assert parse_header(header) is None
+
+
+def test_parse_header_accepts_limits():
+    assert parse_header(f"v2,1,{MAX_IMAGE_SIZE},{MAX_METADATA_SIZE}".encode()) == ("1", MAX_IMAGE_SIZE, MAX_METADATA_SIZE)
+    assert parse_header(b"1,0") == ("1", 0, 0)
+
+
+def test_device_history_is_bounded():
+    store = DeviceStateStore()
+    state = store.get("cam-1")
+    assert store.get("cam-1") is state
+    for _ in range(DEVICE_HISTORY_LENGTH):
+        store.record_detection(state, True)
+    assert store.record_detection(state, False) == DEVICE_HISTORY_LENGTH - 1
+    assert len(state.history) == DEVICE_HISTORY_LENGTH
+
+
+def test_evict_stale_devices():
+    store = DeviceStateStore(ttl=60)
+    old, fresh = store.get("old"), store.get("fresh")
+    now = time.time()
+    old.last_seen = now - 61
+    fresh.last_seen = now - 59
+
+    assert store.evict_stale(now) == 1
+    assert len(store) == 1 and old.evicted and not fresh.evicted
+    assert store.get("old") is not old
+
+
+def test_session_refetches_evicted_device():
+    store = DeviceStateStore(ttl=60)
+    session = ClientSession(("10.0.0.5", 1234))
+    state = session.device_for(store, "cam-1")
+    assert session.device_for(store, "cam-1") is state
+
+    state.last_seen = time.time() - 120
+    store.evict_stale()
+    fresh = session.device_for(store, "cam-1")
+    assert fresh is not state and store.get("cam-1") is fresh
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "device_state.json")
+    store = DeviceStateStore(ttl=60)
+    state = store.get("cam-1")
+    store.record_detection(state, True)
+    store.record_detection(state, False)
+    store.update(state, "alert", "42", False)
+    stale = store.get("cam-2")
+    stale.last_seen = time.time() - 120
+    store.save(path)
+    assert not (tmp_path / "device_state.json.tmp").exists()
+    assert set(json.loads(open(path).read())["devices"]) == {"cam-1", "cam-2"}
+
+    restored = DeviceStateStore(ttl=60)
+    # The stale device is skipped on load
+    assert restored.load(path) == 1
+    loaded = restored.get("cam-1")
+    assert list(loaded.history) == [True, False]
+    assert (loaded.mode, loaded.frame_count, loaded.last_detection) == ("alert", "42", False)
+    assert len(restored) == 1
+
+
+def test_load_without_snapshot(tmp_path):
+    assert DeviceStateStore().load(str(tmp_path / "missing.json")) == 0
+
+
+def test_detection_executor_matches_inline_results():
+    executor = DetectionExecutor(lambda message: None, workers=1, max_batch=4)
+    try:
+        metadata = [{"sensor": {"motion": i % 2 == 0}} for i in range(12)]
+        results = [None] * len(metadata)
+
+        def upload(i):
+            results[i] = executor.detect(b"jpeg", metadata[i])
+
+        threads = [threading.Thread(target=upload, args=(i,)) for i in range(len(metadata))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert results == [detect_cat(b"jpeg", m) for m in metadata]
+        stats = executor.snapshot()
+        assert stats["frames"] == 12 and stats["errors"] == 0
+        assert stats["batches"] <= 12 and stats["avg_batch_size"] <= 4
+    finally:
+        executor.close()
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    # The server writes images, metadata, its log and device state under the cwd
+    monkeypatch.chdir(tmp_path)
+    server = CatCamServer(detect_workers=0)
+    server.log_writer.echo = False
+    server.running = True
+    yield server
+    server.storage.close()
+    server.log_writer.close()
+
+
+def upload(sock, frame, device_id="nicla-catcam-007", motion=True, image=b"\xff\xd8jpeg\xff\xd9"):
+    """Send one v2 upload and return the parsed reply"""
+    metadata = json.dumps({"device_id": device_id, "mode": "standby", "sensor": {"motion": motion}}).encode()
+    sock.sendall(f"v2,{frame},{len(image)},{len(metadata)}\n".encode() + image + metadata)
+    line = b""
+    while not line.endswith(b"\n"):
+        chunk = sock.recv(4096)
+        if not chunk:
+            break
+        line += chunk
+    return json.loads(line) if line else None
+
+
+def two_frame_session(device_sock):
+    first = upload(device_sock, 1, motion=True)
+    second = upload(device_sock, 2, motion=False)
+    device_sock.shutdown(socket.SHUT_WR)
+    # The server closes its end once the device ends the session
+    assert device_sock.recv(1) == b""
+    return first, second
+
+
+def saved_images(server):
+    # Wait for the write-behind workers (closing again at teardown is harmless)
+    server.storage.close()
+    return sorted(os.listdir(server.save_dir))
+
+
+def test_threaded_engine_session(server, pair):
+    server_sock, device_sock = pair
+    handler = threading.Thread(target=server.handle_client, args=(server_sock, ("127.0.0.1", 5000)))
+    handler.start()
+    first, second = two_frame_session(device_sock)
+    handler.join(5)
+
+    assert (first["frame"], first["next_mode"], first["detection"]["cat_detected"]) == ("1", "alert", True)
+    assert (second["frame"], second["detection"]["cat_detected"]) == ("2", False)
+    assert server.frame_count == 2
+    images = saved_images(server)
+    assert len(images) == 2 and all(name.startswith("nicla-catcam-007_frame_") for name in images)
+
+
+def test_asyncio_engine_session(server, pair):
+    server_sock, device_sock = pair
+
+    async def serve():
+        server.client_slots = asyncio.Semaphore(1)
+        reader, writer = await asyncio.open_connection(sock=server_sock)
+        await server.handle_client_async(reader, writer)
+
+    handler = threading.Thread(target=asyncio.run, args=(serve(),))
+    handler.start()
+    first, second = two_frame_session(device_sock)
+    handler.join(5)
+
+    assert (first["frame"], first["next_mode"]) == ("1", "alert")
+    assert (second["frame"], second["detection"]["cat_detected"]) == ("2", False)
+    assert server.frame_count == 2
+    assert len(saved_images(server)) == 2
+
+
+def test_resent_frame_is_answered_once(server, pair):
+    server_sock, device_sock = pair
+    handler = threading.Thread(target=server.handle_client, args=(server_sock, ("127.0.0.1", 5000)))
+    handler.start()
+    first = upload(device_sock, 5)
+    # The camera missed the reply and sends the same frame again
+    again = upload(device_sock, 5)
+    third = upload(device_sock, 6)
+    device_sock.shutdown(socket.SHUT_WR)
+    handler.join(5)
+
+    assert again == dict(first, duplicate=True)
+    assert "duplicate" not in third
+    assert server.frame_count == 2
+    assert len(server.devices.get("nicla-catcam-007").history) == 2
+    assert len(saved_images(server)) == 2
+
+
+def test_idle_session_is_closed(server, pair, monkeypatch):
+    monkeypatch.setattr(catcam_server, "SESSION_IDLE_TIMEOUT", 0.2)
+    server_sock, device_sock = pair
+    handler = threading.Thread(target=server.handle_client, args=(server_sock, ("127.0.0.1", 5000)))
+    handler.start()
+    assert upload(device_sock, 1)["frame"] == "1"
+
+    # No next header: the server gives up on the session
+    handler.join(5)
+    assert not handler.is_alive()
+    assert device_sock.recv(1) == b""
+
+
+def test_log_writer_flushes_full_batches(tmp_path):
+    path = tmp_path / "log.txt"
+    writer = BatchedLogWriter(str(path), echo=False, flush_lines=3, flush_interval=30)
+    try:
+        for i in range(4):
+            writer.write(f"line {i}")
+        # The first three make a full batch; the fourth waits for the interval or close()
+        deadline = time.monotonic() + 5
+        while not (path.exists() and path.read_text().count("\n") >= 3) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.05)
+        assert path.read_text().splitlines() == ["line 0", "line 1", "line 2"]
+    finally:
+        writer.close()
+    assert path.read_text().splitlines() == [f"line {i}" for i in range(4)]
+
+    # Lines logged after close() still reach the file
+    writer.write("late")
+    assert path.read_text().splitlines()[-1] == "late"
+
+
+def test_log_writer_rotates(tmp_path):
+    path = tmp_path / "log.txt"
+    writer = BatchedLogWriter(str(path), echo=False, flush_lines=1, max_bytes=100, backup_count=2)
+    for i in range(40):
+        writer.write(f"line {i:02d} " + "x" * 20)
+    writer.close()
+
+    assert (tmp_path / "log.txt.1").exists() and (tmp_path / "log.txt.2").exists()
+    assert not (tmp_path / "log.txt.3").exists()
+    assert all(f.stat().st_size <= 100 + 30 for f in tmp_path.iterdir())
+    # Oldest backup first, the kept lines are the newest ones in order
+    kept = [line[:7] for name in ("log.txt.2", "log.txt.1", "log.txt")
+            for line in (tmp_path / name).read_text().splitlines()]
+    assert kept == [f"line {i:02d}" for i in range(40 - len(kept), 40)]
+
+
+def test_log_writer_counts_dropped_lines(tmp_path, monkeypatch):
+    entered, release = threading.Event(), threading.Event()
+
+    class BlockedStdout:
+        def write(self, text):
+            entered.set()
+            release.wait(5)
+
+        def flush(self):
+            pass
+
+    monkeypatch.setattr(catcam_server.sys, "stdout", BlockedStdout())
+    path = tmp_path / "log.txt"
+    writer = BatchedLogWriter(str(path), echo=True, max_queue=2, flush_lines=1)
+    writer.write("first")
+    # The writer thread is now stuck echoing "first"
+    assert entered.wait(5)
+    for i in range(5):
+        writer.write(f"line {i}")
+    assert writer.dropped == 3
+    release.set()
+    writer.close()
+
+    lines = path.read_text().splitlines()
+    assert [line for line in lines if line.startswith(("first", "line"))] == ["first", "line 0", "line 1"]
+    assert lines.count("[log] 3 lines dropped, log queue full") == 1
+
+
+@pytest.mark.parametrize("durability", ["none", "batch", "always"])
+def test_storage_writer_durability(tmp_path, monkeypatch, durability):
+    synced = []
+    real_fsync = os.fsync
+    monkeypatch.setattr(os, "fsync", lambda fd: synced.append(fd) or real_fsync(fd))
+    saved = []
+    storage = StorageWriter(lambda message: None, workers=1, durability=durability, fsync_batch=2, fsync_interval=30)
+    for i in range(4):
+        storage.submit(str(tmp_path / f"{i}.jpg"), b"jpeg%d" % i, str(tmp_path / f"{i}.json"), {"seq": i},
+                       on_saved=saved.append)
+    storage.close()
+
+    for i in range(4):
+        assert (tmp_path / f"{i}.jpg").read_bytes() == b"jpeg%d" % i
+        assert json.loads((tmp_path / f"{i}.json").read_text()) == {"seq": i}
+    assert saved == [str(tmp_path / f"{i}.jpg") for i in range(4)]
+    stats = storage.snapshot()
+    assert (stats["submitted"], stats["written"], stats["failed"]) == (4, 4, 0)
+    if durability == "none":
+        assert not synced and stats["fsyncs"] == 0
+    elif durability == "batch":
+        # Two passes of two frames: 2 x (2 images + 2 metadata files + the directory)
+        assert stats["fsyncs"] == 2 and len(synced) == 10
+    else:
+        assert len(synced) == 8 and stats["fsyncs"] == 0
+
+
+def test_storage_writer_metadata_optional_and_failures(tmp_path):
+    storage = StorageWriter(lambda message: None, workers=1)
+    storage.submit(str(tmp_path / "a.jpg"), b"a", None, {})
+    storage.submit(str(tmp_path / "missing" / "b.jpg"), b"b", None, {})
+    storage.close()
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a.jpg"]
+    assert (storage.snapshot()["written"], storage.snapshot()["failed"]) == (1, 1)
+
+
+def test_storage_writer_backpressure(tmp_path):
+    entered, release = threading.Event(), threading.Event()
+
+    def stall(path):
+        entered.set()
+        release.wait(5)
+
+    storage = StorageWriter(lambda message: None, workers=1, max_queue=1)
+    storage.submit(str(tmp_path / "0.jpg"), b"0", None, {}, on_saved=stall)
+    assert entered.wait(5)
+    # The worker is busy and the queue holds one frame, so the next submit blocks
+    storage.submit(str(tmp_path / "1.jpg"), b"1", None, {})
+    blocked = threading.Thread(target=storage.submit, args=(str(tmp_path / "2.jpg"), b"2", None, {}))
+    blocked.start()
+    blocked.join(0.2)
+    assert blocked.is_alive()
+
+    release.set()
+    blocked.join(5)
+    storage.close()
+    stats = storage.snapshot()
+    assert stats["queue_full_events"] == 1 and stats["blocked_seconds"] >= 0.2
+    assert (stats["submitted"], stats["written"]) == (3, 3)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["0.jpg", "1.jpg", "2.jpg"]
+
+
+def test_db_bridge_group_commits(tmp_path, monkeypatch):
+    monkeypatch.setenv("CATCAM_IMAGES_DIR", str(tmp_path / "images"))
+    monkeypatch.setenv("CATCAM_METADATA_DIR", str(tmp_path / "metadata"))
+    path_before = list(sys.path)
+
+    bridge = DbBridge(lambda message: None, batch_size=3, batch_interval=30)
+    assert sys.path == path_before
+    assert bridge.images_dir == str(tmp_path / "images")
+    devices = ["nicla-catcam-001", "nicla-catcam-002", "unknown"]
+    for i in range(7):
+        bridge.submit({"filename": f"{i}.jpg", "cameraId": camera_id_from_device(devices[i % 3]),
+                       "file_type": "jpg", "confidence": 0.5})
+    bridge.close()
+
+    stats = bridge.snapshot()
+    # Two full batches of 3, then the last row is committed on close
+    assert (stats["inserted"], stats["commits"], stats["failed"], stats["dropped"]) == (7, 3, 0, 0)
+    with sqlite3.connect(tmp_path / "metadata" / "db.sqlite3") as conn:
+        rows = conn.execute("SELECT filename, cameraId FROM images ORDER BY id").fetchall()
+    assert rows == [(f"{i}.jpg", [1, 2, None][i % 3]) for i in range(7)]
+
+
+def test_db_bridge_needs_backend(tmp_path):
+    with pytest.raises(ImportError):
+        DbBridge(lambda message: None, backend_dir=str(tmp_path))
@@ -1,21 +1,34 @@
 import os
-import sqlite3
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional
 
-from . import db_utils
+from machineVisionLibrary import Classifier, get_classifier
 
+from . import db_utils, retention, thumbnails
 
-def _stub_classify_image(filepath: str) -> tuple[str, float]:
-    """Fallback classifier used when no ML library is wired in.
-    Returns a (label, confidence) tuple. This is deterministic and cheap.
+
+# classify_all: images fetched and written back per round, and classifier threads
+CLASSIFY_BATCH_SIZE = 500
+CLASSIFY_WORKERS = min(8, os.cpu_count() or 1)
+
+
+# Filters accepted by get_images / iter_images (besides limit and cursor)
+IMAGE_FILTERS = ("classified", "cameraId", "since", "before", "classification", "min_confidence", "max_confidence")
+
+
+def _resolve_classifier(classifier=None) -> tuple:
+    """(classify, model_name, model_version, classify_batch) for a classifier argument.
+
+    None means the active registry model; a Classifier instance is used with
+    its name/version; a plain callable is recorded without model info.
+    classify_batch is set for batch-aware models (BatchClassifier).
     """
-    # Simple heuristic: classify by filename contents
-    name = os.path.basename(filepath).lower()
-    if "cat" in name:
-        return "cat", 0.95
-    if "dog" in name:
-        return "dog", 0.9
-    return "unknown", 0.5
+    if classifier is None:
+        classifier = get_classifier()
+    if isinstance(classifier, Classifier):
+        classify_batch = classifier.classify_batch if getattr(classifier, "batched", False) else None
+        return classifier.classify, classifier.name, str(classifier.version), classify_batch
+    return classifier, None, None, None
 
 
 def classify_image(image_id: int, classifier: Optional[callable] = None) -> dict:
@@ -32,14 +45,16 @@ def classify_image(image_id: int, classifier: Optional[callable] = None) -> dict
     if not os.path.exists(filepath):
         return {"error": "image file missing"}
 
-    classifier = classifier or _stub_classify_image
-    label, confidence = classifier(filepath)
+    classify, model_name, model_version, _ = _resolve_classifier(classifier)
+    label, confidence = classify(filepath)
 
     updated = db_utils.update_metadata(
         image_id,
         classification=label,
         classified=True,
-        confidence=float(confidence)
+        confidence=float(confidence),
+        model_name=model_name,
+        model_version=model_version
     )
     if not updated:
         return {"error": "failed to update metadata"}
@@ -47,28 +62,96 @@ def classify_image(image_id: int, classifier: Optional[callable] = None) -> dict
     return db_utils.get_metadata_by_id(image_id)
 
 
-def classify_all(classifier: Optional[callable] = None) -> dict:
+def classify_all(classifier: Optional[callable] = None, batch_size: int = CLASSIFY_BATCH_SIZE, workers: int = CLASSIFY_WORKERS) -> dict:
     """Classify every image in the DB that has not yet been classified.
 
-    Returns a summary dict: { total entries: <total entries>, classified: <num processed>, errors: [..] }
+    Unclassified images are taken `batch_size` at a time; each batch is run
+    through the classifier on `workers` threads and written back with a
+    single executemany.
+
+    Returns a summary dict: { total entries: <total entries>, classified: <num classified>, unclassified: <num left>, errors: [..] }
+    """
+    errors = []
+    for _, _, batch_errors in iter_classify_batches(classifier, batch_size, workers):
+        errors.extend(batch_errors)
+
+    counts = db_utils.count_images()
+    return {"total entries": counts["total"], "unclassified": counts["unclassified"], "classified": counts["classified"], "errors": errors}
+
+
+def iter_classify_batches(classifier: Optional[callable] = None, batch_size: int = CLASSIFY_BATCH_SIZE, workers: int = CLASSIFY_WORKERS, after_id: int = 0):
+    """Classify unclassified images with id > after_id, one batch at a time.
+
+    Yields (last_id, classified_count, errors) once each batch has been
+    written, so callers can record progress or stop between batches.
     """
-    classifier = classifier or _stub_classify_image
-    # Query only images that are not yet classified
-    unclassified = db_utils.query_images(classified=False)
-    classified = db_utils.query_images(classified=True)
-    results = {"total entries": len(unclassified)+len(classified), "unclassified": len(unclassified), "classified": len(classified), "errors": []}
-    for item in unclassified:
-        image_id = item.get("id")
+    classify, model_name, model_version, classify_batch = _resolve_classifier(classifier)
+    if classify_batch is not None:
+        # Whole model batches per round, so only the very last one runs short
+        model_batch = classifier_batch_size(classifier)
+        batch_size = max(batch_size // model_batch, 1) * model_batch
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            batch = db_utils.get_unclassified_batch(after_id, batch_size)
+            if not batch:
+                break
+            after_id = batch[-1][0]
+            results, batch_errors = _classify_batch(batch, classify, pool, classify_batch)
+            db_utils.set_classifications(results, model_name, model_version)
+            yield after_id, len(results), batch_errors
+
+
+def classifier_batch_size(classifier=None) -> int:
+    """Inference batch size of a batch-aware classifier (1 for per-image ones)."""
+    if classifier is None:
+        classifier = get_classifier()
+    return getattr(classifier, "batch_size", 1) if getattr(classifier, "batched", False) else 1
+
+
+def _classify_batch(batch, classify, pool, classify_batch=None) -> tuple[list, list]:
+    """Run the classifier over (id, filename) pairs. Returns ([(id, label, confidence)], [error dicts]).
+
+    Batch-aware models get all paths at once; other classifiers are called
+    per image on `pool`.
+    """
+    def run(filepath):
         try:
-            res = classify_image(image_id, classifier=classifier)
-            if "error" in res:
-                results["errors"].append({"id": image_id, "error": res["error"]})
-            else:   
-                results["unclassified"] -= 1
-                results["classified"] += 1
+            return classify(filepath)
         except Exception as e:
-            results["errors"].append({"id": image_id, "error": str(e)})
-    return results
+            return e
+
+    pending, errors = [], []
+    for image_id, filename in batch:
+        filepath = os.path.join(db_utils.IMAGES_DIR, filename)
+        if not os.path.exists(filepath):
+            errors.append({"id": image_id, "error": "image file missing"})
+        else:
+            pending.append((image_id, filepath))
+    paths = [filepath for _, filepath in pending]
+    outcomes = classify_batch(paths) if classify_batch is not None else pool.map(run, paths)
+
+    results = []
+    for (image_id, _), outcome in zip(pending, outcomes):
+        if isinstance(outcome, Exception):
+            errors.append({"id": image_id, "error": str(outcome)})
+        else:
+            label, confidence = outcome
+            results.append((image_id, label, float(confidence)))
+    return results, errors
+
+
+def iter_images(**filters):
+    """Stream get_images results (with `path` attached) without building a list.
+
+    Raises ValueError for an invalid cursor before any row is read.
+    """
+    rows = db_utils.iter_images(**filters)
+    return (_with_path(img) for img in rows)
+
+
+def _with_path(img: dict) -> dict:
+    img["path"] = os.path.join(db_utils.IMAGES_DIR, img["filename"]) if img.get("filename") else None
+    return img
 
 
 def execute_command(action: str, params: dict | None = None):
@@ -85,18 +168,13 @@ def execute_command(action: str, params: dict | None = None):
         # remove DB file and images folder contents (use cautiously)
         # Clear DB table if DB exists
         try:
-            conn = sqlite3.connect(db_utils.DB_FILE)
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM images")
-            conn.commit()
-            conn.close()
+            db_utils.clear_images()
         except Exception:
             pass
 
         # delete image files
         try:
-            for fn in os.listdir(db_utils.IMAGES_DIR):
-                os.remove(os.path.join(db_utils.IMAGES_DIR, fn))
+            retention.unlink_files([os.path.join(db_utils.IMAGES_DIR, fn) for fn in os.listdir(db_utils.IMAGES_DIR)])
         except FileNotFoundError:
             pass
         return {"ok": True}
@@ -115,9 +193,21 @@ def execute_command(action: str, params: dict | None = None):
                 classified=params.get("classified", False),
                 confidence=params.get("confidence")
             )
+            thumbnails.schedule(os.path.join(db_utils.IMAGES_DIR, params["filename"]))
             return {"id": image_id}
         return {"error": "filename required"}
 
+    if action == "insert_metadata_many":
+        rows = params.get("rows") if params else None
+        if not rows:
+            return {"error": "rows required"}
+        if any(not row.get("filename") for row in rows):
+            return {"error": "filename required"}
+        ids = db_utils.insert_metadata_many(rows)
+        for row in rows:
+            thumbnails.schedule(os.path.join(db_utils.IMAGES_DIR, row["filename"]))
+        return {"ids": ids}
+
     if action == "classify_image":
         image_id = params.get("image_id") if params else None
         if not image_id:
@@ -134,21 +224,25 @@ def execute_command(action: str, params: dict | None = None):
         meta = db_utils.get_metadata_by_id(int(image_id))
         if not meta:
             return {"error": "image not found"}
-        path = db_utils.get_image_path_by_id(int(image_id))
-        return {"metadata": meta, "path": path}
+        return {"metadata": meta, "path": db_utils.image_path(meta)}
 
     if action == "get_images":
-        # params can include: classified (bool), cameraId (int), since (str), before (str), limit (int)
-        classified = params.get("classified") if params else None
-        cameraId = params.get("cameraId") if params else None
-        since = params.get("since") if params else None
-        before = params.get("before") if params else None
-        limit = params.get("limit") if params else None
-        imgs = db_utils.query_images(classified=classified, cameraId=cameraId, since=since, before=before, limit=limit)
-        # attach path
+        # params can include: classified (bool), cameraId (int or list of int), since (str), before (str), limit (int), cursor (str),
+        # classification (str), min_confidence (float), max_confidence (float)
+        params = params or {}
+        limit = params.get("limit")
+        cursor = params.get("cursor")
+        filters = {key: params.get(key) for key in IMAGE_FILTERS}
+        try:
+            if limit is not None:
+                imgs, next_cursor = db_utils.query_images_page(int(limit), cursor=cursor, **filters)
+            else:
+                imgs, next_cursor = db_utils.query_images(cursor=cursor, **filters), None
+        except ValueError as e:
+            return {"error": str(e)}
         for img in imgs:
-            img["path"] = os.path.join(db_utils.IMAGES_DIR, img["filename"]) if img.get("filename") else None
-        return {"images": imgs}
+            _with_path(img)
+        return {"images": imgs, "next_cursor": next_cursor}
 
     return {"error": "unknown command"}
 
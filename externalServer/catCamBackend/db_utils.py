@@ -1,5 +1,11 @@
+import base64
+import json
 import sqlite3
-from datetime import datetime
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime, timezone
 import os
 from pathlib import Path
 
@@ -10,28 +16,262 @@ from pathlib import Path
 IMAGES_DIR = os.environ.get('CATCAM_IMAGES_DIR', '/catCamData/images')
 DB_FILE = os.path.join(os.environ.get('CATCAM_METADATA_DIR', '/catCamData/metadata'), 'db.sqlite3')
 
+# Connection settings. Each thread keeps one open connection per database
+# file (sqlite3 connections must not be shared between threads), so helpers
+# no longer pay for connect + schema parse on every call and statements are
+# reused from the connection's statement cache.
+STATEMENT_CACHE_SIZE = 256
+BUSY_TIMEOUT_SECONDS = 5.0
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",        # readers and the writer do not block each other
+    "PRAGMA synchronous=NORMAL",      # fsync at checkpoints, safe with WAL
+    "PRAGMA cache_size=-16000",       # ~16 MB page cache per connection
+    "PRAGMA mmap_size=268435456",     # 256 MB memory-mapped reads
+    "PRAGMA temp_store=MEMORY",
+)
+
+# Rows pulled per fetchmany() call by iter_images
+EXPORT_BATCH_SIZE = 500
+
+IMAGE_COLUMNS = "id, filename, timestamp, cameraId, file_type, classification, classified, confidence, model_name, model_version"
+
+_local = threading.local()
+# DB files this process has already brought up to SCHEMA_VERSION
+_migrated_files: set[str] = set()
+
+
+class MetadataCache:
+    """Thread-safe LRU cache of metadata rows by image id, with a TTL.
+
+    Writers call invalidate()/clear(). Each invalidation bumps `generation`;
+    put() is skipped if the generation moved since the caller read the row,
+    so a read racing an update cannot re-cache the old row.
+    """
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._rows = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Cached copy of the row, or None."""
+        with self._lock:
+            entry = self._rows.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._rows.move_to_end(key)
+                self.hits += 1
+                return dict(entry[1])
+            if entry is not None:
+                del self._rows[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, row: dict, generation: int) -> None:
+        with self._lock:
+            if generation != self.generation or self.maxsize <= 0:
+                return
+            self._rows[key] = (time.monotonic() + self.ttl, dict(row))
+            self._rows.move_to_end(key)
+            while len(self._rows) > self.maxsize:
+                self._rows.popitem(last=False)
+
+    def invalidate(self, key) -> None:
+        with self._lock:
+            self.generation += 1
+            self._rows.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._rows.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._rows), "maxsize": self.maxsize, "ttl": self.ttl, "hits": self.hits, "misses": self.misses}
+
+
+# Rows served by get_metadata_by_id; sized by env for deployments with hot galleries
+metadata_cache = MetadataCache(
+    maxsize=int(os.environ.get('CATCAM_METADATA_CACHE_SIZE', 1024)),
+    ttl=float(os.environ.get('CATCAM_METADATA_CACHE_TTL', 30.0)),
+)
+
+
+def get_connection() -> sqlite3.Connection:
+    """Return this thread's connection to DB_FILE, opening and tuning it on first use.
+
+    The first connection a process opens to a DB file also migrates it, so
+    no query ever runs against an older schema.
+    """
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+    conn = connections.get(DB_FILE)
+    if conn is None:
+        conn = connections[DB_FILE] = _open_connection()
+        if DB_FILE not in _migrated_files:
+            migrate()
+    return conn
+
+
+def _open_connection(**kwargs) -> sqlite3.Connection:
+    conn = sqlite3.connect(DB_FILE, timeout=BUSY_TIMEOUT_SECONDS, cached_statements=STATEMENT_CACHE_SIZE, **kwargs)
+    for pragma in SQLITE_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+@contextmanager
+def transaction():
+    """Yield this thread's connection inside a transaction (commit on success, rollback on error)."""
+    conn = get_connection()
+    with conn:
+        yield conn
+
+
+@contextmanager
+def write_transaction():
+    """Like transaction(), but takes the write lock up front (BEGIN IMMEDIATE)
+    so reads inside it cannot be invalidated by another writer."""
+    conn = get_connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
+
+def close_connections() -> None:
+    """Close every connection opened by the calling thread."""
+    connections = getattr(_local, 'connections', None) or {}
+    for conn in connections.values():
+        conn.close()
+    connections.clear()
+
+
+def _row_to_dict(row) -> dict:
+    return {
+        "id": row[0],
+        "filename": row[1],
+        "timestamp": row[2],
+        "cameraId": row[3],
+        "file_type": row[4],
+        "classification": row[5],
+        "classified": bool(row[6]),
+        "confidence": row[7],
+        "model_name": row[8],
+        "model_version": row[9]
+    }
+
+def _migration_1_create_images(conn: sqlite3.Connection) -> None:
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS images (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            filename TEXT NOT NULL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            cameraId INTEGER,
+            file_type TEXT,
+            classification TEXT,
+            classified BOOLEAN,
+            confidence FLOAT
+        )
+    ''')
+
+
+def _migration_2_query_indexes(conn: sqlite3.Connection) -> None:
+    # query_images reads page ids from these alone (see _paged_image_query).
+    # Each leads with at most one equality filter, then timestamp and id, so
+    # ORDER BY timestamp DESC, id DESC needs no sort; the trailing columns
+    # answer the remaining filters without touching the table. The timestamp
+    # index serves mixes with no equality filter, such as confidence alone.
+    # cameraId IN (...) searches the camera index once per camera and merges
+    # those ranges with a temp B-tree sort, still without reading the table.
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_images_timestamp_cover ON images(timestamp, id, cameraId, classification, confidence, classified)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_images_camera_cover ON images(cameraId, timestamp, id, classification, confidence, classified)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_images_classification_cover ON images(classification, timestamp, id, confidence, cameraId, classified)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_images_classified_cover ON images(classified, timestamp, id, cameraId, classification, confidence)")
+
+
+def _migration_3_jobs(conn: sqlite3.Connection) -> None:
+    # Background jobs (see jobs.py). last_id is the resume point for classify jobs.
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            status TEXT NOT NULL,
+            total INTEGER NOT NULL DEFAULT 0,
+            processed INTEGER NOT NULL DEFAULT 0,
+            errors INTEGER NOT NULL DEFAULT 0,
+            error_samples TEXT NOT NULL DEFAULT '[]',
+            last_id INTEGER NOT NULL DEFAULT 0,
+            run_seconds FLOAT NOT NULL DEFAULT 0,
+            cancel_requested BOOLEAN NOT NULL DEFAULT 0,
+            message TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            started_at DATETIME,
+            finished_at DATETIME
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_kind_status ON jobs(kind, status)")
+
+
+def _migration_4_retention(conn: sqlite3.Connection) -> None:
+    # Retention (retention.py) needs file sizes for byte quotas; rows from
+    # before this column are sized lazily through idx_images_unsized.
+    conn.execute("ALTER TABLE images ADD COLUMN file_size INTEGER")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_images_unsized ON images(id) WHERE file_size IS NULL")
+
+
+def _migration_5_model_columns(conn: sqlite3.Connection) -> None:
+    # Which classifier (machineVisionLibrary registry name + version) labelled the row
+    conn.execute("ALTER TABLE images ADD COLUMN model_name TEXT")
+    conn.execute("ALTER TABLE images ADD COLUMN model_version TEXT")
+
+# Schema migrations, applied in order. PRAGMA user_version holds the number
+# of migrations already applied, so a current database costs one pragma read.
+# Append new migrations to the end; never edit or reorder applied ones.
+MIGRATIONS = [
+    _migration_1_create_images,
+    _migration_2_query_indexes,
+    _migration_3_jobs,
+    _migration_4_retention,
+    _migration_5_model_columns,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def migrate() -> int:
+    """Bring DB_FILE up to SCHEMA_VERSION in place. Returns the resulting version.
+
+    get_connection() calls this once per process and DB file, so callers
+    only need it to upgrade eagerly (e.g. at startup).
+    """
+    if get_connection().execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        _migrated_files.add(DB_FILE)
+        return SCHEMA_VERSION
+
+    with write_transaction() as conn:
+        # Re-read under the write lock in case another thread or process migrated first
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for number in range(version + 1, SCHEMA_VERSION + 1):
+            MIGRATIONS[number - 1](conn)
+            conn.execute(f"PRAGMA user_version = {number}")
+    _migrated_files.add(DB_FILE)
+    return max(version, SCHEMA_VERSION)
+
+
 def init_db():
     # Ensure directories exist
     os.makedirs(os.path.dirname(DB_FILE), exist_ok=True)
     os.makedirs(IMAGES_DIR, exist_ok=True)
 
-    if not os.path.exists(DB_FILE):
-        conn = sqlite3.connect(DB_FILE)
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS images (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                filename TEXT NOT NULL,
-                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                cameraId INTEGER,
-                file_type TEXT,
-                classification TEXT,
-                classified BOOLEAN,
-                confidence FLOAT
-            )
-        ''')
-        conn.commit()
-        conn.close()
+    migrate()
 
 def insert_metadata(
     filename: str,
@@ -41,68 +281,74 @@ def insert_metadata(
     classified: bool = False,
     confidence: float = None
 ) -> int:
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute(
-        '''
-        INSERT INTO images (
-            filename, cameraId, file_type, classification, classified, confidence
-        ) VALUES (?, ?, ?, ?, ?, ?)
-        ''',
-        (filename, cameraId, file_type, classification, classified, confidence)
-    )
-    conn.commit()
-    image_id = cursor.lastrowid
-    conn.close()
-    return image_id
+    with transaction() as conn:
+        cursor = conn.execute(
+            '''
+            INSERT INTO images (
+                filename, cameraId, file_type, classification, classified, confidence
+            ) VALUES (?, ?, ?, ?, ?, ?)
+            ''',
+            (filename, cameraId, file_type, classification, classified, confidence)
+        )
+    return cursor.lastrowid
 
-def get_all_metadata() -> list[dict]:
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT id, filename, timestamp, cameraId, file_type, classification, classified, confidence FROM images"
-    )
-    rows = cursor.fetchall()
-    conn.close()
-    return [
-        {
-            "id": row[0],
-            "filename": row[1],
-            "timestamp": row[2],
-            "cameraId": row[3],
-            "file_type": row[4],
-            "classification": row[5],
-            "classified": bool(row[6]),
-            "confidence": row[7]
-        }
+def insert_metadata_many(rows: list[dict]) -> list[int]:
+    """Insert many metadata rows with one executemany in a single transaction.
+
+    Each row is a dict with the same keys as insert_metadata's arguments; only
+    `filename` is required. Returns the assigned ids, in the order of `rows`.
+    """
+    values = [
+        (
+            row["filename"],
+            row.get("cameraId"),
+            row.get("file_type"),
+            row.get("classification"),
+            row.get("classified", False),
+            row.get("confidence"),
+        )
         for row in rows
     ]
+    if not values:
+        return []
+    with write_transaction() as conn:
+        # AUTOINCREMENT ids follow sqlite_sequence, and holding the write lock
+        # means nobody else can take ids between this read and the insert
+        row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'images'").fetchone()
+        first_id = (row[0] if row else 0) + 1
+        conn.executemany(
+            '''
+            INSERT INTO images (
+                filename, cameraId, file_type, classification, classified, confidence
+            ) VALUES (?, ?, ?, ?, ?, ?)
+            ''',
+            values
+        )
+    return list(range(first_id, first_id + len(values)))
+
+def get_all_metadata() -> list[dict]:
+    rows = get_connection().execute(f"SELECT {IMAGE_COLUMNS} FROM images").fetchall()
+    return [_row_to_dict(row) for row in rows]
 
 
 def get_metadata_by_id(image_id: int) -> dict | None:
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute(
-        "SELECT id, filename, timestamp, cameraId, file_type, classification, classified, confidence FROM images WHERE id = ?",
+    """Metadata for one image, served from metadata_cache when possible."""
+    meta = metadata_cache.get(image_id)
+    if meta is not None:
+        return meta
+    generation = metadata_cache.generation
+    row = get_connection().execute(
+        f"SELECT {IMAGE_COLUMNS} FROM images WHERE id = ?",
         (image_id,)
-    )
-    row = cursor.fetchone()
-    conn.close()
+    ).fetchone()
     if not row:
         return None
-    return {
-        "id": row[0],
-        "filename": row[1],
-        "timestamp": row[2],
-        "cameraId": row[3],
-        "file_type": row[4],
-        "classification": row[5],
-        "classified": bool(row[6]),
-        "confidence": row[7]
-    }
+    meta = _row_to_dict(row)
+    metadata_cache.put(image_id, meta, generation)
+    return meta
 
 
-def update_metadata(image_id: int, *, filename: str = None, cameraId: int = None, file_type: str = None, classification: str = None, classified: bool = None, confidence: float = None) -> bool:
+def update_metadata(image_id: int, *, filename: str = None, cameraId: int = None, file_type: str = None, classification: str = None, classified: bool = None, confidence: float = None, model_name: str = None, model_version: str = None) -> bool:
     # Build dynamic update
     fields = {}
     if filename is not None:
@@ -117,6 +363,10 @@ def update_metadata(image_id: int, *, filename: str = None, cameraId: int = None
         fields['classified'] = int(bool(classified))
     if confidence is not None:
         fields['confidence'] = confidence
+    if model_name is not None:
+        fields['model_name'] = model_name
+    if model_version is not None:
+        fields['model_version'] = model_version
 
     if not fields:
         return False
@@ -125,30 +375,141 @@ def update_metadata(image_id: int, *, filename: str = None, cameraId: int = None
     values = list(fields.values())
     values.append(image_id)
 
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute(f"UPDATE images SET {set_clause} WHERE id = ?", values)
-    conn.commit()
-    updated = cursor.rowcount > 0
-    conn.close()
-    return updated
+    with transaction() as conn:
+        cursor = conn.execute(f"UPDATE images SET {set_clause} WHERE id = ?", values)
+    metadata_cache.invalidate(image_id)
+    return cursor.rowcount > 0
 
 def delete_metadata(image_id: int) -> bool:
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute("SELECT filename FROM images WHERE id = ?", (image_id,))
-    row = cursor.fetchone()
-    if row:
+    with transaction() as conn:
+        row = conn.execute("SELECT filename FROM images WHERE id = ?", (image_id,)).fetchone()
+        if not row:
+            return False
         filename = row[0]
         filepath = os.path.join(IMAGES_DIR, filename)
         if os.path.exists(filepath):
             os.remove(filepath)
-        cursor.execute("DELETE FROM images WHERE id = ?", (image_id,))
-        conn.commit()
-        conn.close()
-        return True
-    conn.close()
-    return False
+        conn.execute("DELETE FROM images WHERE id = ?", (image_id,))
+    metadata_cache.invalidate(image_id)
+    return True
+
+
+def clear_images() -> None:
+    """Delete every metadata row (image files are left to the caller)."""
+    with transaction() as conn:
+        conn.execute("DELETE FROM images")
+    metadata_cache.clear()
+
+
+def backfill_file_sizes(batch_size: int = 500) -> int:
+    """Store file_size for rows that lack it (0 when the file is missing). Returns rows updated."""
+    updated = 0
+    while True:
+        rows = get_connection().execute(
+            "SELECT id, filename FROM images WHERE file_size IS NULL LIMIT ?", (batch_size,)
+        ).fetchall()
+        if not rows:
+            return updated
+        sizes = []
+        for image_id, filename in rows:
+            try:
+                size = os.path.getsize(os.path.join(IMAGES_DIR, filename))
+            except OSError:
+                size = 0
+            sizes.append((size, image_id))
+        with transaction() as conn:
+            conn.executemany("UPDATE images SET file_size = ? WHERE id = ?", sizes)
+        updated += len(rows)
+
+
+def _retention_scope(cameraId, classification) -> tuple[list, list]:
+    clauses = []
+    params = []
+    if cameraId is not None:
+        clauses.append("cameraId = ?")
+        params.append(cameraId)
+    if classification is not None:
+        clauses.append("classification = ?")
+        params.append(classification)
+    return clauses, params
+
+
+def quota_cutoff(max_bytes: int, cameraId: int | None = None, classification: str | None = None) -> tuple[str, int] | None:
+    """(timestamp, id) of the newest row that does not fit in `max_bytes` when
+    keeping newest rows first, or None if the whole scope fits. Sizes must be backfilled."""
+    clauses, params = _retention_scope(cameraId, classification)
+    where = " WHERE " + " AND ".join(clauses) if clauses else ""
+    row = get_connection().execute(
+        f"""
+        SELECT timestamp, id FROM (
+            SELECT timestamp, id, SUM(file_size) OVER (ORDER BY timestamp DESC, id DESC) AS kept
+            FROM images{where}
+        ) WHERE kept > ? ORDER BY timestamp DESC, id DESC LIMIT 1
+        """,
+        (*params, max_bytes)
+    ).fetchone()
+    return tuple(row) if row else None
+
+
+def select_for_deletion(cameraId: int | None = None, classification: str | None = None, older_than: str | None = None, through: tuple[str, int] | None = None, limit: int = 500) -> list[tuple[int, str]]:
+    """Oldest (id, filename) pairs in scope with timestamp < older_than and/or (timestamp, id) <= through."""
+    clauses, params = _retention_scope(cameraId, classification)
+    if older_than is not None:
+        clauses.append("timestamp < ?")
+        params.append(older_than)
+    if through is not None:
+        clauses.append("(timestamp, id) <= (?, ?)")
+        params.extend(through)
+    where = " WHERE " + " AND ".join(clauses) if clauses else ""
+    return get_connection().execute(
+        f"SELECT id, filename FROM images{where} ORDER BY timestamp, id LIMIT ?",
+        (*params, limit)
+    ).fetchall()
+
+
+def delete_images(image_ids: list[int]) -> int:
+    """Delete many metadata rows in one transaction (files are left to the caller)."""
+    with transaction() as conn:
+        cursor = conn.executemany("DELETE FROM images WHERE id = ?", [(image_id,) for image_id in image_ids])
+    for image_id in image_ids:
+        metadata_cache.invalidate(image_id)
+    return cursor.rowcount
+
+
+def count_images() -> dict:
+    """Row counts by classified status: {"total": n, "classified": n, "unclassified": n}."""
+    counts = dict(get_connection().execute(
+        "SELECT classified, COUNT(*) FROM images GROUP BY classified"
+    ).fetchall())
+    classified = counts.get(1, 0)
+    unclassified = counts.get(0, 0)
+    return {"total": classified + unclassified, "classified": classified, "unclassified": unclassified}
+
+
+def get_unclassified_batch(after_id: int = 0, limit: int = 500) -> list[tuple[int, str]]:
+    """Next `limit` unclassified (id, filename) pairs with id > after_id, in id order.
+
+    Walking batches by id is a single pass over the table however many
+    batches are taken, and rows that fail to classify are not revisited.
+    """
+    return get_connection().execute(
+        "SELECT id, filename FROM images WHERE classified = 0 AND id > ? ORDER BY id LIMIT ?",
+        (after_id, limit)
+    ).fetchall()
+
+
+def set_classifications(results: list[tuple[int, str, float]], model_name: str | None = None, model_version: str | None = None) -> int:
+    """Mark many images classified with one executemany. `results` holds (id, label, confidence)."""
+    if not results:
+        return 0
+    with transaction() as conn:
+        conn.executemany(
+            "UPDATE images SET classification = ?, classified = 1, confidence = ?, model_name = ?, model_version = ? WHERE id = ?",
+            [(label, confidence, model_name, model_version, image_id) for image_id, label, confidence in results]
+        )
+    for image_id, _, _ in results:
+        metadata_cache.invalidate(image_id)
+    return len(results)
 
 
 def get_image_path_by_id(image_id: int) -> str | None:
@@ -156,51 +517,225 @@ def get_image_path_by_id(image_id: int) -> str | None:
     meta = get_metadata_by_id(image_id)
     if not meta:
         return None
+    return image_path(meta)
+
+
+def image_path(meta: dict) -> str:
+    """Absolute path of the image file described by a metadata row."""
     return os.path.join(IMAGES_DIR, meta['filename'])
 
 
-def query_images(classified: bool | None = None, cameraId: int | None = None, since: str | None = None, before: str | None = None, limit: int | None = None) -> list[dict]:
-    """Query images with simple filters. since/before expect ISO-like strings or partial SQL DATETIME compatible strings.
+def encode_cursor(row: dict) -> str:
+    """Opaque pagination cursor pointing just after `row` in (timestamp, id) DESC order."""
+    raw = json.dumps([row["timestamp"], row["id"]], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
 
-    This is a thin helper around SQL SELECT and returns the same metadata dicts as get_all_metadata.
+
+def decode_cursor(cursor: str) -> tuple[str, int]:
+    """Inverse of encode_cursor. Raises ValueError for malformed cursors."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        timestamp, image_id = json.loads(raw)
+    except Exception:
+        raise ValueError("invalid cursor")
+    if not isinstance(timestamp, str) or not isinstance(image_id, int):
+        raise ValueError("invalid cursor")
+    return timestamp, image_id
+
+
+def _image_query(columns=IMAGE_COLUMNS, classified=None, cameraId=None, since=None, before=None, cursor=None,
+                 classification=None, min_confidence=None, max_confidence=None) -> tuple[str, list]:
+    """SELECT statement and parameters shared by query_images and iter_images.
+
+    cameraId may be a single id or a list of ids.
     """
-    q = "SELECT id, filename, timestamp, cameraId, file_type, classification, classified, confidence FROM images"
+    q = f"SELECT {columns} FROM images"
     clauses = []
     params = []
     if classified is not None:
         clauses.append("classified = ?")
         params.append(int(bool(classified)))
     if cameraId is not None:
-        clauses.append("cameraId = ?")
-        params.append(cameraId)
+        camera_ids = list(cameraId) if isinstance(cameraId, (list, tuple, set)) else [cameraId]
+        if len(camera_ids) == 1:
+            clauses.append("cameraId = ?")
+        else:
+            clauses.append(f"cameraId IN ({', '.join('?' for _ in camera_ids)})")
+        params.extend(camera_ids)
+    if classification is not None:
+        clauses.append("classification = ?")
+        params.append(classification)
+    if min_confidence is not None:
+        clauses.append("confidence >= ?")
+        params.append(float(min_confidence))
+    if max_confidence is not None:
+        clauses.append("confidence <= ?")
+        params.append(float(max_confidence))
     if since is not None:
         clauses.append("timestamp >= ?")
         params.append(since)
     if before is not None:
         clauses.append("timestamp <= ?")
         params.append(before)
+    if cursor is not None:
+        clauses.append("(timestamp, id) < (?, ?)")
+        params.extend(decode_cursor(cursor))
 
     if clauses:
         q += " WHERE " + " AND ".join(clauses)
-    q += " ORDER BY timestamp DESC"
-    if limit is not None:
-        q += f" LIMIT {int(limit)}"
-
-    conn = sqlite3.connect(DB_FILE)
-    cursor = conn.cursor()
-    cursor.execute(q, tuple(params))
-    rows = cursor.fetchall()
-    conn.close()
-    return [
-        {
-            "id": row[0],
-            "filename": row[1],
-            "timestamp": row[2],
-            "cameraId": row[3],
-            "file_type": row[4],
-            "classification": row[5],
-            "classified": bool(row[6]),
-            "confidence": row[7]
-        }
-        for row in rows
-    ]
+    q += " ORDER BY timestamp DESC, id DESC"
+    return q, params
+
+
+def _paged_image_query(limit=None, **filters) -> tuple[str, list]:
+    if limit is None:
+        return _image_query(**filters)
+    # Find the page's ids with an index-only scan of a covering index, then
+    # read just those rows from the table
+    q, params = _image_query("id", **filters)
+    # Bound as a parameter so every limit shares one cached statement
+    q = f"SELECT {IMAGE_COLUMNS} FROM images WHERE id IN ({q} LIMIT ?) ORDER BY timestamp DESC, id DESC"
+    params.append(int(limit))
+    return q, params
+
+
+def query_images(classified: bool | None = None, cameraId: int | list[int] | None = None, since: str | None = None, before: str | None = None, limit: int | None = None, cursor: str | None = None,
+                 classification: str | None = None, min_confidence: float | None = None, max_confidence: float | None = None) -> list[dict]:
+    """Query images with simple filters. since/before expect ISO-like strings or partial SQL DATETIME compatible strings.
+
+    cameraId may be one id or a list of ids. classification matches the label
+    exactly; min_confidence/max_confidence bound the score (inclusive).
+
+    Results are ordered newest first by (timestamp, id). Pass a `cursor` from
+    encode_cursor (or query_images_page) to continue after that row; the
+    cursor is applied as an index seek, so later pages cost the same as the first.
+
+    This is a thin helper around SQL SELECT and returns the same metadata dicts as get_all_metadata.
+    """
+    q, params = _paged_image_query(limit, classified=classified, cameraId=cameraId, since=since, before=before, cursor=cursor,
+                                   classification=classification, min_confidence=min_confidence, max_confidence=max_confidence)
+    rows = get_connection().execute(q, tuple(params)).fetchall()
+    return [_row_to_dict(row) for row in rows]
+
+
+def explain_query_images(**kwargs) -> list[str]:
+    """EXPLAIN QUERY PLAN details for the statement query_images(**kwargs) would run."""
+    q, params = _paged_image_query(**kwargs)
+    rows = get_connection().execute("EXPLAIN QUERY PLAN " + q, tuple(params)).fetchall()
+    return [row[-1] for row in rows]
+
+
+def iter_images(classified: bool | None = None, cameraId: int | list[int] | None = None, since: str | None = None, before: str | None = None, cursor: str | None = None,
+                classification: str | None = None, min_confidence: float | None = None, max_confidence: float | None = None, batch_size: int = EXPORT_BATCH_SIZE):
+    """Like query_images, but yields rows as they are read, `batch_size` at a time.
+
+    Memory stays flat however many rows match. The iterator reads through its
+    own connection (closed when exhausted or garbage collected), so it can be
+    advanced from any thread, e.g. by a streaming HTTP response. Filters are
+    validated here, before the first row is requested.
+    """
+    q, params = _image_query(classified=classified, cameraId=cameraId, since=since, before=before, cursor=cursor,
+                             classification=classification, min_confidence=min_confidence, max_confidence=max_confidence)
+    return _iter_rows(q, tuple(params), batch_size)
+
+
+def _iter_rows(q: str, params: tuple, batch_size: int):
+    # check_same_thread=False: the consumer may resume us on another thread,
+    # but never from two threads at once. get_connection() first, so the
+    # schema is current before this private connection reads it.
+    get_connection()
+    conn = _open_connection(check_same_thread=False)
+    try:
+        cur = conn.execute(q, params)
+        while True:
+            rows = cur.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield _row_to_dict(row)
+    finally:
+        conn.close()
+
+
+def query_images_page(limit: int, cursor: str | None = None, **filters) -> tuple[list[dict], str | None]:
+    """One page of query_images plus the cursor for the next page (None on the last page).
+
+    Raises ValueError unless limit is at least 1.
+    """
+    if limit < 1:
+        raise ValueError("limit must be at least 1")
+    rows = query_images(limit=limit + 1, cursor=cursor, **filters)
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1])
+
+
+JOB_COLUMNS = "id, kind, status, total, processed, errors, error_samples, last_id, run_seconds, cancel_requested, message, created_at, started_at, finished_at"
+ACTIVE_JOB_STATUSES = ("queued", "running")
+
+
+def _job_row_to_dict(row) -> dict:
+    job = dict(zip([c.strip() for c in JOB_COLUMNS.split(",")], row))
+    job["error_samples"] = json.loads(job["error_samples"])
+    job["cancel_requested"] = bool(job["cancel_requested"])
+    return job
+
+
+def create_job(kind: str, total: int = 0) -> tuple[int, bool]:
+    """Queue a job unless one of the same kind is already queued or running.
+
+    Returns (job_id, created); when created is False, job_id is the active job.
+    """
+    with write_transaction() as conn:
+        row = conn.execute(
+            "SELECT id FROM jobs WHERE kind = ? AND status IN (?, ?) ORDER BY id LIMIT 1",
+            (kind, *ACTIVE_JOB_STATUSES)
+        ).fetchone()
+        if row:
+            return row[0], False
+        cursor = conn.execute("INSERT INTO jobs (kind, status, total) VALUES (?, 'queued', ?)", (kind, total))
+    return cursor.lastrowid, True
+
+
+def get_job(job_id: int) -> dict | None:
+    row = get_connection().execute(f"SELECT {JOB_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    if not row:
+        return None
+    return _job_row_to_dict(row)
+
+
+def list_jobs(kind: str | None = None, statuses: tuple | None = None) -> list[dict]:
+    q = f"SELECT {JOB_COLUMNS} FROM jobs"
+    clauses = []
+    params = []
+    if kind is not None:
+        clauses.append("kind = ?")
+        params.append(kind)
+    if statuses:
+        clauses.append(f"status IN ({', '.join('?' for _ in statuses)})")
+        params.extend(statuses)
+    if clauses:
+        q += " WHERE " + " AND ".join(clauses)
+    q += " ORDER BY id"
+    rows = get_connection().execute(q, tuple(params)).fetchall()
+    return [_job_row_to_dict(row) for row in rows]
+
+
+def update_job(job_id: int, **fields) -> bool:
+    """Set job columns by name. error_samples may be passed as a list."""
+    if not fields:
+        return False
+    if "error_samples" in fields:
+        fields["error_samples"] = json.dumps(fields["error_samples"])
+    set_clause = ', '.join([f"{k} = ?" for k in fields.keys()])
+    values = list(fields.values())
+    values.append(job_id)
+    with transaction() as conn:
+        cursor = conn.execute(f"UPDATE jobs SET {set_clause} WHERE id = ?", values)
+    return cursor.rowcount > 0
+
+
+def utc_now() -> str:
+    """Current UTC time in the same format as SQLite's CURRENT_TIMESTAMP."""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
@@ -0,0 +1,70 @@
+"""Executors that keep blocking work off the event loop for server.py's async routes.
+
+Reads, writes and classification each get their own pool, so a dashboard
+read never waits behind a long insert or a classifier run:
+
+- reads: several threads; WAL lets every thread's connection read concurrently
+- writes: one thread; SQLite has a single writer anyway, so extra threads
+  would only wait on the lock
+- cpu: classification (classifier calls plus their metadata updates)
+"""
+
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+DB_READ_WORKERS = int(os.environ.get('CATCAM_DB_READ_WORKERS', 8))
+CPU_WORKERS = int(os.environ.get('CATCAM_CPU_WORKERS', os.cpu_count() or 1))
+
+# name -> (max_workers, thread name prefix)
+_POOL_SIZES = {
+    "read": (DB_READ_WORKERS, "db-read"),
+    "write": (1, "db-write"),
+    "cpu": (CPU_WORKERS, "cpu"),
+}
+
+_lock = threading.Lock()
+_pools: dict[str, ThreadPoolExecutor] = {}
+
+
+def _pool(name: str) -> ThreadPoolExecutor:
+    """The named pool, created on first use and again after shutdown()."""
+    pool = _pools.get(name)
+    if pool is None:
+        with _lock:
+            pool = _pools.get(name)
+            if pool is None:
+                workers, prefix = _POOL_SIZES[name]
+                pool = _pools[name] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=prefix)
+    return pool
+
+
+async def _run(name, fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_pool(name), functools.partial(fn, *args, **kwargs))
+
+
+async def run_read(fn, *args, **kwargs):
+    """Await fn(*args, **kwargs) on the DB read pool."""
+    return await _run("read", fn, *args, **kwargs)
+
+
+async def run_write(fn, *args, **kwargs):
+    """Await fn(*args, **kwargs) on the single DB writer thread."""
+    return await _run("write", fn, *args, **kwargs)
+
+
+async def run_cpu(fn, *args, **kwargs):
+    """Await fn(*args, **kwargs) on the classification pool."""
+    return await _run("cpu", fn, *args, **kwargs)
+
+
+def shutdown(wait: bool = True) -> None:
+    """Shut the pools down. The next run_* call starts fresh ones, so an app can start again in the same process."""
+    with _lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=wait)
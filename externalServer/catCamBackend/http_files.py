@@ -0,0 +1,66 @@
+"""HTTP caching and Range helpers for serving image files (GET /images/{id}/raw).
+
+Kept free of web framework imports so they can be used and tested on their own.
+"""
+
+import os
+from email.utils import formatdate
+
+# The URL is keyed by image id, not by file identity: a recreated or
+# restored database hands the same ids to different files. Caches keep the
+# bytes but revalidate them with the ETag (a cheap 304) on every use.
+RAW_CACHE_CONTROL = "no-cache"
+
+
+def file_etag(st: os.stat_result) -> str:
+    """Strong ETag from file identity: inode, size and mtime (ns)."""
+    return f'"{st.st_ino:x}-{st.st_size:x}-{st.st_mtime_ns:x}"'
+
+
+def cache_headers(st: os.stat_result) -> dict:
+    return {
+        "ETag": file_etag(st),
+        "Last-Modified": formatdate(st.st_mtime, usegmt=True),
+        "Cache-Control": RAW_CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+    }
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """If-None-Match check (weak comparison, as RFC 9110 requires for this header)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return etag in [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+
+
+def parse_range(header: str | None, size: int) -> tuple[int, int] | None:
+    """Resolve a single `bytes=` Range header to an inclusive (start, end).
+
+    Returns None when the header should be ignored (absent, malformed, other
+    units or multiple ranges), in which case the whole file is sent. Raises
+    ValueError when the range cannot be satisfied (answer 416).
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep or not (first or last) or not all(part.isdigit() for part in (first, last) if part):
+        return None
+    if first:
+        start = int(first)
+        end = int(last) if last else size - 1
+        if last and start > end:
+            return None
+    else:
+        suffix = int(last)
+        if suffix == 0:
+            raise ValueError("empty suffix range")
+        start, end = max(0, size - suffix), size - 1
+    if start >= size:
+        raise ValueError("range start beyond end of file")
+    return start, min(end, size - 1)
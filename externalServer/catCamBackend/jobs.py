@@ -0,0 +1,139 @@
+"""Background classification jobs.
+
+A classify job runs commands.iter_classify_batches on a daemon thread and
+writes its progress to the jobs table after every batch. Only one classify
+job may be queued or running at a time. Because progress (including the
+last image id handled) is in the database, a job interrupted by a restart
+is picked up by resume_jobs() and continues after its last written batch.
+"""
+
+import os
+import threading
+import time
+from typing import Optional
+
+from . import commands, db_utils
+
+CLASSIFY_JOB = "classify"
+# Per-image errors kept on the job row; the count is always exact
+MAX_ERROR_SAMPLES = 100
+
+_lock = threading.Lock()
+_threads: dict[int, threading.Thread] = {}
+_cancel_events: dict[int, threading.Event] = {}
+
+
+def job_status(job_id: int) -> dict | None:
+    """Job row plus derived throughput (images/second of run time)."""
+    job = db_utils.get_job(job_id)
+    if not job:
+        return None
+    job["throughput"] = round(job["processed"] / job["run_seconds"], 3) if job["run_seconds"] else 0.0
+    return job
+
+
+def submit_classify_job(classifier: Optional[callable] = None, batch_size: int = commands.CLASSIFY_BATCH_SIZE) -> dict:
+    """Start classifying the unclassified backlog in the background.
+
+    Returns the new job, or {"error": ..., "job_id": <active id>} if a
+    classify job is already queued or running. `classifier` only applies to
+    this process; a resumed job uses the default classifier.
+    """
+    with _lock:
+        total = db_utils.count_images()["unclassified"]
+        job_id, created = db_utils.create_job(CLASSIFY_JOB, total=total)
+        if not created:
+            return {"error": "a classify job is already running", "job_id": job_id}
+        _start(job_id, classifier, batch_size)
+    return job_status(job_id)
+
+
+def cancel_job(job_id: int) -> dict:
+    """Ask a job to stop after its current batch. Finished jobs are returned unchanged."""
+    with _lock:
+        job = db_utils.get_job(job_id)
+        if not job:
+            return {"error": "job not found"}
+        if job["status"] in db_utils.ACTIVE_JOB_STATUSES:
+            db_utils.update_job(job_id, cancel_requested=True)
+            event = _cancel_events.get(job_id)
+            if event is not None:
+                event.set()
+            else:
+                # Not running in this process (e.g. not resumed yet)
+                db_utils.update_job(job_id, status="cancelled", finished_at=db_utils.utc_now())
+    return job_status(job_id)
+
+
+def resume_jobs() -> list[int]:
+    """Restart jobs left queued or running by a previous process. Returns their ids."""
+    if not os.path.exists(db_utils.DB_FILE):
+        # Nothing to resume before init_db has run
+        return []
+    resumed = []
+    with _lock:
+        for job in db_utils.list_jobs(CLASSIFY_JOB, db_utils.ACTIVE_JOB_STATUSES):
+            if job["id"] in _threads:
+                continue
+            if job["cancel_requested"]:
+                db_utils.update_job(job["id"], status="cancelled", finished_at=db_utils.utc_now())
+                continue
+            _start(job["id"], None, commands.CLASSIFY_BATCH_SIZE)
+            resumed.append(job["id"])
+    return resumed
+
+
+def wait_for_job(job_id: int, timeout: float | None = None) -> dict | None:
+    """Block until the job's thread in this process exits (or timeout), then return its status."""
+    thread = _threads.get(job_id)
+    if thread is not None:
+        thread.join(timeout)
+    return job_status(job_id)
+
+
+def _start(job_id: int, classifier, batch_size: int) -> None:
+    # Caller holds _lock
+    cancel = _cancel_events[job_id] = threading.Event()
+    thread = _threads[job_id] = threading.Thread(
+        target=_run_classify_job, args=(job_id, classifier, batch_size, cancel),
+        name=f"classify-job-{job_id}", daemon=True
+    )
+    thread.start()
+
+
+def _run_classify_job(job_id: int, classifier, batch_size: int, cancel: threading.Event) -> None:
+    try:
+        job = db_utils.get_job(job_id)
+        processed = job["processed"]
+        errors = job["errors"]
+        samples = job["error_samples"]
+        run_seconds = job["run_seconds"]
+        db_utils.update_job(job_id, status="running", started_at=job["started_at"] or db_utils.utc_now())
+
+        status = "completed"
+        started = time.monotonic()
+        if cancel.is_set():
+            status = "cancelled"
+        else:
+            batches = commands.iter_classify_batches(classifier, batch_size, after_id=job["last_id"])
+            for last_id, classified, batch_errors in batches:
+                now = time.monotonic()
+                run_seconds += now - started
+                started = now
+                processed += classified + len(batch_errors)
+                errors += len(batch_errors)
+                samples = (samples + batch_errors)[:MAX_ERROR_SAMPLES]
+                db_utils.update_job(job_id, processed=processed, errors=errors, error_samples=samples,
+                                    last_id=last_id, run_seconds=run_seconds)
+                if cancel.is_set():
+                    status = "cancelled"
+                    batches.close()
+                    break
+        db_utils.update_job(job_id, status=status, finished_at=db_utils.utc_now())
+    except Exception as e:
+        db_utils.update_job(job_id, status="failed", message=str(e), finished_at=db_utils.utc_now())
+    finally:
+        with _lock:
+            _threads.pop(job_id, None)
+            _cancel_events.pop(job_id, None)
+        db_utils.close_connections()
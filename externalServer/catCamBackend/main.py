@@ -7,16 +7,19 @@ It intentionally does not require FastAPI.
 """
 
 from argparse import ArgumentParser
-from . import db_utils, commands
+from . import db_utils, commands, retention
 
 
 def main():
 	parser = ArgumentParser()
-	parser.add_argument('action', choices=['init_db','insert_metadata','list','classify_all','classify_image'])
+	parser.add_argument('action', choices=['init_db','insert_metadata','list','classify_all','classify_image','retention'])
 	parser.add_argument('--filename')
 	parser.add_argument('--image_id', type=int)
 	args = parser.parse_args()
 
+	# Every action expects the current schema, including on an older DB file
+	db_utils.init_db()
+
 	if args.action == 'init_db':
 		db_utils.init_db()
 		print('db initialized at', db_utils.DB_FILE)
@@ -36,6 +39,8 @@ def main():
 			print('image_id required')
 			return
 		print("results =", commands.execute_command('classify_image', {'image_id': args.image_id}))
+	elif args.action == 'retention':
+		print("report =", retention.run_retention())
 
 
 if __name__ == '__main__':
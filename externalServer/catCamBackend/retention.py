@@ -0,0 +1,174 @@
+"""Retention policy: age limits and byte quotas per camera and/or classification.
+
+A policy is a JSON file (path in CATCAM_RETENTION_POLICY) holding a list of
+rules, e.g.
+
+    {"rules": [
+        {"classification": "cat", "max_age_days": 90},
+        {"classification": "unknown", "max_age_days": 3},
+        {"cameraId": 2, "max_bytes": 5000000000}
+    ]}
+
+A rule without cameraId/classification covers every image. Rules are
+independent: an image is removed as soon as any rule says so. Quotas keep
+the newest images that fit.
+
+run_retention() removes rows in batched transactions, oldest first, then
+unlinks their files on a worker pool. start_scheduler() repeats it every
+CATCAM_RETENTION_INTERVAL seconds on a background thread.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from . import db_utils
+
+RETENTION_POLICY_FILE = os.environ.get('CATCAM_RETENTION_POLICY')
+RETENTION_INTERVAL = float(os.environ.get('CATCAM_RETENTION_INTERVAL', 3600))
+DELETE_BATCH_SIZE = 500
+UNLINK_WORKERS = 8
+
+_run_lock = threading.Lock()
+_reports = deque(maxlen=20)
+_scheduler = None
+_scheduler_stop = None
+
+
+class RetentionRule:
+    """Limits for the images matching cameraId and/or classification (None matches any)."""
+
+    FIELDS = ("cameraId", "classification", "max_age_days", "max_bytes")
+
+    def __init__(self, cameraId=None, classification=None, max_age_days=None, max_bytes=None):
+        if max_age_days is None and max_bytes is None:
+            raise ValueError("retention rule needs max_age_days and/or max_bytes")
+        self.cameraId = cameraId
+        self.classification = classification
+        self.max_age_days = max_age_days
+        self.max_bytes = max_bytes
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "RetentionRule":
+        unknown = set(data) - set(cls.FIELDS)
+        if unknown:
+            raise ValueError(f"unknown retention rule fields: {sorted(unknown)}")
+        return cls(**data)
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.FIELDS if getattr(self, name) is not None}
+
+
+def load_policy(path: str | None = None) -> list[RetentionRule]:
+    """Rules from a policy file ({"rules": [...]} or a bare list). No file means no rules."""
+    path = path or RETENTION_POLICY_FILE
+    if not path:
+        return []
+    with open(path) as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get("rules", [])
+    return [RetentionRule.from_dict(rule) for rule in data]
+
+
+def _unlink(path: str) -> int:
+    """Remove a file, returning the bytes it held (0 if it was already gone)."""
+    try:
+        size = os.stat(path).st_size
+        os.remove(path)
+    except FileNotFoundError:
+        return 0
+    return size
+
+
+def unlink_files(paths, pool: ThreadPoolExecutor | None = None) -> int:
+    """Remove files on a worker pool. Returns bytes reclaimed."""
+    if pool is None:
+        with ThreadPoolExecutor(max_workers=UNLINK_WORKERS, thread_name_prefix="unlink") as own_pool:
+            return sum(own_pool.map(_unlink, paths))
+    return sum(pool.map(_unlink, paths))
+
+
+def _purge(pool, rule: RetentionRule, batch_size: int, **bounds) -> tuple[int, int]:
+    deleted = reclaimed = 0
+    while True:
+        rows = db_utils.select_for_deletion(rule.cameraId, rule.classification, limit=batch_size, **bounds)
+        if not rows:
+            return deleted, reclaimed
+        deleted += db_utils.delete_images([image_id for image_id, _ in rows])
+        # Rows go first: a crash here leaves orphan files, never rows without files
+        reclaimed += unlink_files([os.path.join(db_utils.IMAGES_DIR, filename) for _, filename in rows], pool)
+
+
+def run_retention(rules: list[RetentionRule] | None = None, now: datetime | None = None, batch_size: int = DELETE_BATCH_SIZE) -> dict:
+    """Apply every rule once. Returns a report with per-rule and total deletions and bytes reclaimed."""
+    rules = load_policy() if rules is None else rules
+    now = now or datetime.now(timezone.utc)
+    started = time.monotonic()
+    report = {"started_at": db_utils.utc_now(), "rules": [], "deleted": 0, "bytes_reclaimed": 0}
+    with _run_lock:
+        if any(rule.max_bytes is not None for rule in rules):
+            db_utils.backfill_file_sizes(batch_size)
+        with ThreadPoolExecutor(max_workers=UNLINK_WORKERS, thread_name_prefix="retention-unlink") as pool:
+            for rule in rules:
+                deleted = reclaimed = 0
+                if rule.max_age_days is not None:
+                    older_than = (now - timedelta(days=rule.max_age_days)).strftime("%Y-%m-%d %H:%M:%S")
+                    d, r = _purge(pool, rule, batch_size, older_than=older_than)
+                    deleted, reclaimed = deleted + d, reclaimed + r
+                if rule.max_bytes is not None:
+                    cutoff = db_utils.quota_cutoff(rule.max_bytes, rule.cameraId, rule.classification)
+                    if cutoff is not None:
+                        d, r = _purge(pool, rule, batch_size, through=cutoff)
+                        deleted, reclaimed = deleted + d, reclaimed + r
+                report["rules"].append({"rule": rule.to_dict(), "deleted": deleted, "bytes_reclaimed": reclaimed})
+                report["deleted"] += deleted
+                report["bytes_reclaimed"] += reclaimed
+    report["duration_s"] = round(time.monotonic() - started, 3)
+    _reports.append(report)
+    return report
+
+
+def recent_reports() -> list[dict]:
+    """Reports of the latest runs, oldest first."""
+    return list(_reports)
+
+
+def start_scheduler(rules: list[RetentionRule] | None = None, interval: float = RETENTION_INTERVAL) -> bool:
+    """Run retention now and then every `interval` seconds. Returns False when there are no rules."""
+    global _scheduler, _scheduler_stop
+    rules = load_policy() if rules is None else rules
+    if not rules:
+        return False
+    if _scheduler is not None and _scheduler.is_alive():
+        return True
+    _scheduler_stop = threading.Event()
+    _scheduler = threading.Thread(target=_schedule_loop, args=(rules, interval, _scheduler_stop),
+                                  name="retention", daemon=True)
+    _scheduler.start()
+    return True
+
+
+def stop_scheduler(timeout: float | None = None) -> None:
+    global _scheduler
+    if _scheduler is None:
+        return
+    _scheduler_stop.set()
+    _scheduler.join(timeout)
+    _scheduler = None
+
+
+def _schedule_loop(rules, interval: float, stop: threading.Event) -> None:
+    while True:
+        if os.path.exists(db_utils.DB_FILE):
+            try:
+                run_retention(rules)
+            except Exception as e:
+                _reports.append({"started_at": db_utils.utc_now(), "error": str(e)})
+        if stop.wait(interval):
+            break
+    db_utils.close_connections()
@@ -11,6 +11,8 @@ class ImageMetadata(BaseModel):
     classification: Optional[str]= None
     classified: bool = False
     confidence: Optional[float]= None
+    model_name: Optional[str]= None
+    model_version: Optional[str]= None
 
 class Command(BaseModel):
     action: str
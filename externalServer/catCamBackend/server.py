@@ -1,10 +1,39 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import Optional, Dict, Any
-from . import commands
+import csv
+import io
+import json
+import mimetypes
+import os
+
+import anyio
+
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from pydantic import BaseModel, ValidationError
+from typing import Optional, Dict, Any, List
+
+import machineVisionLibrary
+
+from . import commands, db_utils, executors, http_files, jobs, retention, thumbnails
+from .executors import run_cpu, run_read, run_write
 
 app = FastAPI(title="CatCam Backend API (minimal)")
 
+# Routes are async and hand blocking work to catCamBackend.executors: reads,
+# writes and classification run on separate pools so they don't queue
+# behind each other or exhaust the default threadpool.
+
+# Most rows accepted by one POST /insert_metadata/batch request
+MAX_BATCH_ROWS = 10000
+# Largest body accepted by the same endpoint, checked before anything is parsed
+MAX_BATCH_BYTES = 16 * 1024 * 1024
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/ndjson", "application/jsonl")
+# How often POST /classify_all checks on the job it is waiting for
+CLASSIFY_ALL_POLL_SECONDS = 0.2
+# Rows formatted into each chunk written by GET /images/export
+EXPORT_CHUNK_ROWS = 500
+EXPORT_FIELDS = ["id", "filename", "timestamp", "cameraId", "file_type", "classification", "classified", "confidence",
+                 "model_name", "model_version", "path"]
+
 
 class InsertMetadataPayload(BaseModel):
     filename: str
@@ -20,59 +49,385 @@ class ClassifyImagePayload(BaseModel):
 
 
 @app.post("/init_db")
-def init_db() -> Dict[str, Any]:
-    res = commands.execute_command("init_db")
+async def init_db() -> Dict[str, Any]:
+    res = await run_write(commands.execute_command, "init_db")
     return res
 
 
 @app.post("/insert_metadata")
-def insert_metadata(payload: InsertMetadataPayload) -> Dict[str, Any]:
+async def insert_metadata(payload: InsertMetadataPayload) -> Dict[str, Any]:
     params = payload.dict()
-    res = commands.execute_command("insert_metadata", params)
+    res = await run_write(commands.execute_command, "insert_metadata", params)
+    if "error" in res:
+        raise HTTPException(status_code=400, detail=res["error"])
+    return res
+
+
+async def _read_batch_rows(request: Request) -> List[dict]:
+    """Parse a JSON array or NDJSON body into row dicts, enforcing MAX_BATCH_BYTES and MAX_BATCH_ROWS.
+
+    A declared Content-Length over the limit is rejected before reading, and
+    the body is counted as it arrives, so an oversized upload is never held
+    in memory. NDJSON bodies are parsed line by line as they arrive.
+    """
+    too_large = HTTPException(status_code=413, detail=f"body larger than {MAX_BATCH_BYTES} bytes")
+    declared = request.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > MAX_BATCH_BYTES:
+        raise too_large
+    received = 0
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type not in NDJSON_CONTENT_TYPES:
+        body = bytearray()
+        async for chunk in request.stream():
+            body += chunk
+            if len(body) > MAX_BATCH_BYTES:
+                raise too_large
+        try:
+            rows = json.loads(body)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="body must be a JSON array")
+        if not isinstance(rows, list):
+            raise HTTPException(status_code=400, detail="body must be a JSON array")
+        if len(rows) > MAX_BATCH_ROWS:
+            raise HTTPException(status_code=413, detail=f"at most {MAX_BATCH_ROWS} rows per request")
+        return rows
+
+    rows = []
+    pending = b""
+    async for chunk in request.stream():
+        received += len(chunk)
+        if received > MAX_BATCH_BYTES:
+            raise too_large
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            if not line.strip():
+                continue
+            if len(rows) >= MAX_BATCH_ROWS:
+                raise HTTPException(status_code=413, detail=f"at most {MAX_BATCH_ROWS} rows per request")
+            try:
+                rows.append(json.loads(line))
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"invalid JSON on line {len(rows) + 1}")
+    if pending.strip():
+        if len(rows) >= MAX_BATCH_ROWS:
+            raise HTTPException(status_code=413, detail=f"at most {MAX_BATCH_ROWS} rows per request")
+        try:
+            rows.append(json.loads(pending))
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"invalid JSON on line {len(rows) + 1}")
+    return rows
+
+
+@app.post("/insert_metadata/batch")
+async def insert_metadata_batch(request: Request) -> Dict[str, Any]:
+    """Insert many rows in one transaction.
+
+    Accepts a JSON array of InsertMetadataPayload objects, or NDJSON (one
+    object per line) with Content-Type application/x-ndjson.
+    Returns {"ids": [...]} in input order.
+    """
+    rows = await _read_batch_rows(request)
+    if not rows:
+        raise HTTPException(status_code=400, detail="no rows")
+    try:
+        params = [InsertMetadataPayload.parse_obj(row).dict() for row in rows]
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors())
+    res = await run_write(commands.execute_command, "insert_metadata_many", {"rows": params})
     if "error" in res:
         raise HTTPException(status_code=400, detail=res["error"])
     return res
 
 
 @app.post("/classify_all")
-def classify_all() -> Dict[str, Any]:
-    return commands.execute_command("classify_all")
+async def classify_all() -> Dict[str, Any]:
+    """Run the backlog as a classify job and wait for it; prefer POST /jobs/classify for large backlogs.
+
+    409 while another classify job is queued or running.
+    """
+    job = await run_write(jobs.submit_classify_job)
+    if "error" in job:
+        raise HTTPException(status_code=409, detail=job)
+    while job["status"] in db_utils.ACTIVE_JOB_STATUSES:
+        await anyio.sleep(CLASSIFY_ALL_POLL_SECONDS)
+        job = await run_read(jobs.job_status, job["id"])
+    counts = await run_read(db_utils.count_images)
+    return {"job_id": job["id"], "status": job["status"], "total entries": counts["total"],
+            "unclassified": counts["unclassified"], "classified": counts["classified"], "errors": job["error_samples"]}
+
+
+@app.on_event("startup")
+def prepare_database() -> None:
+    # Runs first: later hooks and every route expect the current schema
+    db_utils.init_db()
+
+
+@app.on_event("startup")
+def load_classifier() -> None:
+    # Load and warm the configured model before the first request needs it
+    machineVisionLibrary.load_configured()
+
+
+@app.on_event("startup")
+def resume_jobs() -> None:
+    # Pick up classify jobs interrupted by the last shutdown
+    jobs.resume_jobs()
+
+
+@app.on_event("startup")
+def start_retention() -> None:
+    # No-op unless CATCAM_RETENTION_POLICY names a policy file
+    retention.start_scheduler()
+
+
+@app.on_event("shutdown")
+def shutdown_executors() -> None:
+    retention.stop_scheduler(timeout=5)
+    executors.shutdown(wait=False)
+
+
+@app.post("/jobs/classify", status_code=202)
+async def submit_classify_job() -> Dict[str, Any]:
+    """Classify the unclassified backlog in the background. Poll GET /jobs/{id} for progress."""
+    res = await run_write(jobs.submit_classify_job)
+    if "error" in res:
+        raise HTTPException(status_code=409, detail=res)
+    return res
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: int) -> Dict[str, Any]:
+    res = await run_read(jobs.job_status, job_id)
+    if res is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    return res
+
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: int) -> Dict[str, Any]:
+    res = await run_write(jobs.cancel_job, job_id)
+    if "error" in res:
+        raise HTTPException(status_code=404, detail=res["error"])
+    return res
 
 
 @app.post("/classify_image")
-def classify_image(payload: ClassifyImagePayload) -> Dict[str, Any]:
-    res = commands.execute_command("classify_image", {"image_id": payload.image_id})
+async def classify_image(payload: ClassifyImagePayload) -> Dict[str, Any]:
+    res = await run_cpu(commands.execute_command, "classify_image", {"image_id": payload.image_id})
     if "error" in res:
         raise HTTPException(status_code=404, detail=res["error"])
     return res
 
 
 @app.get("/images")
-def get_images(classified: Optional[bool] = None, cameraId: Optional[int] = None, limit: Optional[int] = None):
+async def get_images(classified: Optional[bool] = None, cameraId: Optional[List[int]] = Query(None), limit: Optional[int] = Query(None, ge=1),
+                     since: Optional[str] = None, before: Optional[str] = None, cursor: Optional[str] = None,
+                     classification: Optional[str] = None, min_confidence: Optional[float] = None, max_confidence: Optional[float] = None):
+    """List images newest first. Pass the returned `next_cursor` as `cursor` to get the next page.
+
+    Repeat cameraId (?cameraId=1&cameraId=2) to match any of several cameras.
+    """
     params = {}
     if classified is not None:
         params["classified"] = classified
-    if cameraId is not None:
+    if cameraId:
         params["cameraId"] = cameraId
     if limit is not None:
         params["limit"] = limit
-    res = commands.execute_command("get_images", params)
+    if since is not None:
+        params["since"] = since
+    if before is not None:
+        params["before"] = before
+    if cursor is not None:
+        params["cursor"] = cursor
+    if classification is not None:
+        params["classification"] = classification
+    if min_confidence is not None:
+        params["min_confidence"] = min_confidence
+    if max_confidence is not None:
+        params["max_confidence"] = max_confidence
+    res = await run_read(commands.execute_command, "get_images", params)
     if "error" in res:
         raise HTTPException(status_code=400, detail=res["error"])
     return res
 
 
+def _ndjson_chunks(rows):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(row))
+        if len(lines) >= EXPORT_CHUNK_ROWS:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+
+async def _read_chunks(chunks):
+    """Drive a blocking chunk generator on the DB read pool, one chunk per hop."""
+    while True:
+        chunk = await run_read(next, chunks, None)
+        if chunk is None:
+            break
+        yield chunk
+
+
+def _csv_chunks(rows):
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=EXPORT_FIELDS)
+    writer.writeheader()
+    for n, row in enumerate(rows, 1):
+        writer.writerow(row)
+        if n % EXPORT_CHUNK_ROWS == 0:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+@app.get("/images/export")
+async def export_images(format: str = "ndjson", classified: Optional[bool] = None, cameraId: Optional[List[int]] = Query(None),
+                        since: Optional[str] = None, before: Optional[str] = None, cursor: Optional[str] = None,
+                        classification: Optional[str] = None, min_confidence: Optional[float] = None, max_confidence: Optional[float] = None):
+    """Stream every matching image row as NDJSON (default) or CSV.
+
+    Takes the same filters as GET /images but no limit; rows are read and
+    sent in chunks, so memory use does not grow with the result size.
+    """
+    if format not in ("ndjson", "csv"):
+        raise HTTPException(status_code=400, detail="format must be ndjson or csv")
+    try:
+        rows = commands.iter_images(classified=classified, cameraId=cameraId or None, since=since, before=before, cursor=cursor,
+                                    classification=classification, min_confidence=min_confidence, max_confidence=max_confidence)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if format == "csv":
+        return StreamingResponse(_read_chunks(_csv_chunks(rows)), media_type="text/csv",
+                                 headers={"Content-Disposition": 'attachment; filename="images.csv"'})
+    return StreamingResponse(_read_chunks(_ndjson_chunks(rows)), media_type="application/x-ndjson")
+
+
 @app.get("/images/{image_id}")
-def get_image(image_id: int):
-    res = commands.execute_command("get_image", {"image_id": int(image_id)})
+async def get_image(image_id: int):
+    res = await run_read(commands.execute_command, "get_image", {"image_id": int(image_id)})
     if "error" in res:
         raise HTTPException(status_code=404, detail=res["error"])
     return res
 
 
+class FileRangeResponse(Response):
+    """206 response for one byte range of a file, read in chunks."""
+    chunk_size = 64 * 1024
+
+    def __init__(self, path: str, start: int, end: int, size: int, headers: dict, media_type: str):
+        headers = dict(headers, **{"Content-Range": f"bytes {start}-{end}/{size}", "Content-Length": str(end - start + 1)})
+        super().__init__(status_code=206, headers=headers, media_type=media_type)
+        self.path = path
+        self.start = start
+        self.end = end
+
+    async def __call__(self, scope, receive, send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        remaining = self.end - self.start + 1
+        async with await anyio.open_file(self.path, "rb") as f:
+            await f.seek(self.start)
+            while remaining > 0:
+                chunk = await f.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        if remaining > 0:
+            # File shrank underneath us; end the body so the client sees a short read
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+@app.get("/images/{image_id}/raw")
+async def get_image_raw(image_id: int, request: Request):
+    """Image bytes with a strong ETag, 304 on If-None-Match, single Range requests and ETag revalidation."""
+    res = await run_read(commands.execute_command, "get_image", {"image_id": int(image_id)})
+    if "error" in res:
+        raise HTTPException(status_code=404, detail=res["error"])
+    path = res["path"]
+    try:
+        st = await run_read(os.stat, path)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="image file missing")
+
+    headers = http_files.cache_headers(st)
+    etag = headers["ETag"]
+    if http_files.etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or if_range.strip() == etag):
+        try:
+            byte_range = http_files.parse_range(range_header, st.st_size)
+        except ValueError:
+            raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{st.st_size}"})
+        if byte_range is not None:
+            return FileRangeResponse(path, *byte_range, st.st_size, headers, media_type)
+    # Whole file: FileResponse streams it from disk and keeps our ETag/Last-Modified
+    return FileResponse(path, headers=headers, media_type=media_type, stat_result=st)
+
+
+@app.get("/images/{image_id}/thumb")
+async def get_image_thumb(image_id: int, request: Request, size: int = max(thumbnails.THUMB_SIZES)):
+    """JPEG thumbnail whose longest edge is `size` px (one of thumbnails.THUMB_SIZES)."""
+    if size not in thumbnails.THUMB_SIZES:
+        raise HTTPException(status_code=400, detail=f"size must be one of {list(thumbnails.THUMB_SIZES)}")
+    if not thumbnails.available():
+        raise HTTPException(status_code=503, detail="thumbnails need Pillow")
+    res = await run_read(commands.execute_command, "get_image", {"image_id": int(image_id)})
+    if "error" in res:
+        raise HTTPException(status_code=404, detail=res["error"])
+    source = res["path"]
+    try:
+        st = await run_read(os.stat, source)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="image file missing")
+
+    headers = {"ETag": f'"{thumbnails.thumb_key(st)}-{size}"', "Cache-Control": http_files.RAW_CACHE_CONTROL}
+    if http_files.etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    try:
+        path = await run_cpu(thumbnails.get_thumbnail, source, size, st)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="image file missing")
+    except OSError:
+        raise HTTPException(status_code=415, detail="image cannot be decoded")
+    return FileResponse(path, headers=headers, media_type="image/jpeg")
+
+
 @app.delete("/images/{image_id}")
-def delete_image(image_id: int):
-    res = commands.execute_command("delete_image", {"image_id": int(image_id)})
+async def delete_image(image_id: int):
+    res = await run_write(commands.execute_command, "delete_image", {"image_id": int(image_id)})
     if "error" in res:
         raise HTTPException(status_code=400, detail=res["error"])
     return res
+
+
+@app.get("/stats")
+async def stats() -> Dict[str, Any]:
+    model = machineVisionLibrary.get_classifier()
+    return {"metadata_cache": db_utils.metadata_cache.stats(), "classifier": {"name": model.name, "version": model.version}}
+
+
+@app.get("/retention")
+async def get_retention() -> Dict[str, Any]:
+    """Configured retention rules and reports (deleted, bytes_reclaimed) of recent runs."""
+    rules = await run_read(retention.load_policy)
+    return {"rules": [rule.to_dict() for rule in rules], "reports": retention.recent_reports()}
+
+
+@app.post("/retention/run")
+async def run_retention() -> Dict[str, Any]:
+    """Apply the retention policy now and return the run's report."""
+    rules = await run_read(retention.load_policy)
+    if not rules:
+        raise HTTPException(status_code=400, detail="no retention policy configured (CATCAM_RETENTION_POLICY)")
+    return await run_cpu(retention.run_retention, rules)
@@ -0,0 +1,158 @@
+"""Thumbnail tiers for dashboard grids (GET /images/{id}/thumb).
+
+Every tier in THUMB_SIZES is made from one decode of the original, which
+Pillow's JPEG draft mode already downscales while decoding. Thumbnails live
+in THUMBS_DIR under a key derived from the source file's identity (inode,
+size, mtime), so a replaced file never serves an old thumbnail and stale
+entries simply age out. The directory is kept under THUMBS_MAX_BYTES by
+evicting the least recently used files.
+
+Thumbnails are made in the background after an insert (schedule()) and on
+demand for misses (get_thumbnail()); concurrent misses for the same image
+wait for a single generation.
+"""
+
+import hashlib
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is in requirements.txt; keep the rest of the backend importable without it
+    Image = None
+
+from . import db_utils
+
+THUMBS_DIR = os.environ.get('CATCAM_THUMBS_DIR', os.path.join(os.path.dirname(db_utils.DB_FILE), 'thumbs'))
+THUMBS_MAX_BYTES = int(os.environ.get('CATCAM_THUMBS_MAX_BYTES', 256 * 1024 * 1024))
+# Longest edge in pixels
+THUMB_SIZES = (64, 160)
+THUMB_QUALITY = 80
+THUMB_WORKERS = 2
+
+_pool = ThreadPoolExecutor(max_workers=THUMB_WORKERS, thread_name_prefix="thumbs")
+_lock = threading.Lock()
+_inflight: dict[str, Future] = {}
+_size_lock = threading.Lock()
+_cache_bytes = None  # total size of THUMBS_DIR, scanned on first write
+
+
+def available() -> bool:
+    return Image is not None
+
+
+def thumb_key(st: os.stat_result) -> str:
+    return hashlib.sha1(f"{st.st_ino}-{st.st_size}-{st.st_mtime_ns}".encode()).hexdigest()
+
+
+def thumb_path(key: str, size: int) -> str:
+    return os.path.join(THUMBS_DIR, key[:2], f"{key}-{size}.jpg")
+
+
+def get_thumbnail(source: str, size: int, st: os.stat_result | None = None) -> str:
+    """Path of the `size` thumbnail for the image at `source`, generating the tiers if missing.
+
+    Raises ValueError for an unknown size and FileNotFoundError if the source is gone.
+    """
+    if size not in THUMB_SIZES:
+        raise ValueError(f"size must be one of {THUMB_SIZES}")
+    key = thumb_key(st or os.stat(source))
+    path = thumb_path(key, size)
+    try:
+        # Bump mtime so eviction sees this thumbnail as recently used
+        os.utime(path)
+        return path
+    except FileNotFoundError:
+        pass
+
+    with _lock:
+        future = _inflight.get(key)
+        owner = future is None
+        if owner:
+            future = _inflight[key] = Future()
+    if owner:
+        try:
+            _generate(source, key)
+            future.set_result(None)
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with _lock:
+                _inflight.pop(key, None)
+    future.result()
+    return path
+
+
+def schedule(source: str) -> None:
+    """Generate thumbnails for a newly inserted image on the background pool."""
+    if available():
+        _pool.submit(_generate_quietly, source)
+
+
+def _generate_quietly(source: str) -> None:
+    try:
+        get_thumbnail(source, THUMB_SIZES[0])
+    except Exception:
+        # Missing or unreadable originals are retried lazily on request
+        pass
+
+
+def _generate(source: str, key: str) -> None:
+    if Image is None:
+        raise RuntimeError("Pillow is not installed")
+    largest = max(THUMB_SIZES)
+    with Image.open(source) as im:
+        # JPEG: decode straight to a reduced scale no smaller than the largest tier
+        im.draft("RGB", (largest, largest))
+        im = im.convert("RGB")
+    os.makedirs(os.path.dirname(thumb_path(key, largest)), exist_ok=True)
+    written = 0
+    for size in sorted(THUMB_SIZES, reverse=True):
+        im.thumbnail((size, size))
+        path = thumb_path(key, size)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        im.save(tmp, "JPEG", quality=THUMB_QUALITY)
+        written += os.path.getsize(tmp)
+        os.replace(tmp, path)
+    _account(written)
+
+
+def _account(added: int) -> None:
+    global _cache_bytes
+    with _size_lock:
+        if _cache_bytes is None:
+            _cache_bytes = sum(st.st_size for _, st in _cache_files())
+        else:
+            _cache_bytes += added
+        if _cache_bytes <= THUMBS_MAX_BYTES:
+            return
+        _cache_bytes = _evict(THUMBS_MAX_BYTES * 9 // 10)
+
+
+def _cache_files():
+    """(path, stat) for every thumbnail under THUMBS_DIR."""
+    for bucket in os.scandir(THUMBS_DIR):
+        if not bucket.is_dir():
+            continue
+        for entry in os.scandir(bucket.path):
+            if entry.name.endswith(".jpg"):
+                try:
+                    yield entry.path, entry.stat()
+                except FileNotFoundError:
+                    pass
+
+
+def _evict(target: int) -> int:
+    """Remove least recently used thumbnails until the cache is at most `target` bytes. Returns the new total."""
+    files = sorted(_cache_files(), key=lambda item: item[1].st_mtime_ns)
+    total = sum(st.st_size for _, st in files)
+    for path, st in files:
+        if total <= target:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= st.st_size
+    return total
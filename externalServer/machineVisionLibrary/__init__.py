@@ -0,0 +1,4 @@
+"""Classification models for CatCam. See registry.py for how models are configured."""
+
+from .models import BatchClassifier, Classifier, FilenameClassifier
+from .registry import available, get_classifier, load_configured, register, unload
@@ -0,0 +1,120 @@
+"""Classifier interface and the built-in models."""
+
+import os
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+
+
+class Classifier(ABC):
+    """A classification model kept resident by the registry.
+
+    Subclasses set `name` and `version`, do expensive setup (weights,
+    sessions) in load(), and implement classify(filepath) -> (label, confidence).
+    A subclass without classify() cannot be instantiated.
+    """
+
+    name = "base"
+    version = "0"
+
+    def load(self) -> None:
+        """Load weights etc. Called once, before the first classify()."""
+
+    @abstractmethod
+    def classify(self, filepath: str) -> tuple[str, float]:
+        """(label, confidence) for the image at filepath."""
+
+    def classify_batch(self, filepaths: list[str]) -> list:
+        """One result per path: (label, confidence), or the Exception that path raised."""
+        results = []
+        for filepath in filepaths:
+            try:
+                results.append(self.classify(filepath))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    def warmup(self) -> None:
+        """Run one inference so lazy initialisation (allocations, kernel
+        selection, caches) happens now rather than on the first real request."""
+        try:
+            from PIL import Image
+        except ImportError:
+            return
+        fd, path = tempfile.mkstemp(suffix=".jpg")
+        os.close(fd)
+        try:
+            Image.new("RGB", (320, 240)).save(path, "JPEG")
+            self.classify(path)
+        finally:
+            os.remove(path)
+
+
+class FilenameClassifier(Classifier):
+    """Deterministic stand-in used until a real model is configured: labels by filename."""
+
+    name = "stub"
+    version = "1"
+
+    def classify(self, filepath: str) -> tuple[str, float]:
+        name = os.path.basename(filepath).lower()
+        if "cat" in name:
+            return "cat", 0.95
+        if "dog" in name:
+            return "dog", 0.9
+        return "unknown", 0.5
+
+    def warmup(self) -> None:
+        # Nothing to warm up
+        pass
+
+
+class BatchClassifier(Classifier):
+    """Classifier that scores whole preprocessed batches.
+
+    Subclasses set input_size (height, width), input_dtype ("uint8" or
+    "float32", scaled to 0..1) and batch_size, and implement
+    predict(batch) for an (N, H, W, 3) NHWC array, returning N
+    (label, confidence) tuples. Decoding and resizing happen in a
+    BatchPreprocessor whose buffers are reused from batch to batch.
+    Subclasses that override load() must call super().load().
+    """
+
+    # commands.classify_all hands these models whole batches
+    batched = True
+    input_size = (224, 224)
+    input_dtype = "float32"
+    batch_size = 64
+    decode_workers = None
+
+    def load(self) -> None:
+        from .preprocess import BatchPreprocessor
+        self.preprocessor = BatchPreprocessor(self.input_size, self.batch_size, self.input_dtype, self.decode_workers)
+        # The preprocessor's buffers are shared, so one batch at a time
+        self._batch_lock = threading.Lock()
+
+    @abstractmethod
+    def predict(self, batch) -> list[tuple[str, float]]:
+        """One (label, confidence) per image in an (N, H, W, 3) batch."""
+
+    def classify_batch(self, filepaths: list[str]) -> list:
+        results = []
+        for start in range(0, len(filepaths), self.batch_size):
+            chunk = filepaths[start:start + self.batch_size]
+            with self._batch_lock:
+                batch, errors = self.preprocessor.load(chunk)
+                predictions = self.predict(batch)
+            for i, prediction in enumerate(predictions):
+                results.append(errors.get(i, prediction))
+        return results
+
+    def classify(self, filepath: str) -> tuple[str, float]:
+        result = self.classify_batch([filepath])[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def warmup(self) -> None:
+        # A full-size batch, so the first real one hits warm allocations
+        with self._batch_lock:
+            self.predict(self.preprocessor.buffer)
@@ -0,0 +1,71 @@
+"""Batched image decode and preprocessing for BatchClassifier models.
+
+Frames are decoded with Pillow on a thread pool (decoding and resizing
+release the GIL) straight into one preallocated, contiguous NHWC uint8
+buffer, then optionally scaled to float32 in a second preallocated buffer.
+JPEG draft mode lets libjpeg decode at a reduced scale, so a large frame
+never materialises at full resolution before the resize.
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+DECODE_WORKERS = min(8, os.cpu_count() or 1)
+
+
+class BatchPreprocessor:
+    """Turns lists of image paths into (N, H, W, 3) arrays, reusing its buffers.
+
+    The array returned by load() is a view of an internal buffer: it is
+    only valid until the next load() call.
+    """
+
+    def __init__(self, size: tuple[int, int], batch_size: int, dtype: str = "float32", workers: int | None = None):
+        self.height, self.width = size
+        self.batch_size = batch_size
+        self.dtype = np.dtype(dtype)
+        self._uint8 = np.zeros((batch_size, self.height, self.width, 3), dtype=np.uint8)
+        self._float = np.zeros(self._uint8.shape, dtype=self.dtype) if self.dtype != np.uint8 else None
+        self._pool = ThreadPoolExecutor(max_workers=workers or DECODE_WORKERS, thread_name_prefix="decode")
+
+    @property
+    def buffer(self) -> np.ndarray:
+        """The full-size output buffer (what load() returns a slice of)."""
+        return self._uint8 if self._float is None else self._float
+
+    def load(self, paths: list[str]) -> tuple[np.ndarray, dict[int, Exception]]:
+        """Decode up to batch_size images. Returns (batch, {index: error}).
+
+        Images that fail to decode leave a zeroed slot so the batch stays
+        aligned with `paths`.
+        """
+        if len(paths) > self.batch_size:
+            raise ValueError(f"at most {self.batch_size} paths per batch")
+        n = len(paths)
+        errors = {}
+        for i, error in enumerate(self._pool.map(self._decode_into, paths, range(n))):
+            if error is not None:
+                self._uint8[i] = 0
+                errors[i] = error
+        if self._float is None:
+            return self._uint8[:n], errors
+        np.multiply(self._uint8[:n], np.float32(1 / 255), out=self._float[:n], casting="unsafe")
+        return self._float[:n], errors
+
+    def _decode_into(self, path: str, slot: int) -> Exception | None:
+        try:
+            with Image.open(path) as im:
+                im.draft("RGB", (self.width, self.height))
+                im = im.convert("RGB")
+                if im.size != (self.width, self.height):
+                    im = im.resize((self.width, self.height), Image.BILINEAR)
+                self._uint8[slot] = np.asarray(im)
+        except Exception as e:
+            return e
+        return None
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False)
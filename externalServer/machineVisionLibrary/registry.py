@@ -0,0 +1,101 @@
+"""Named classifier registry.
+
+Models are registered under a name with a factory and loaded at most once
+per process, then kept resident, so neither a request nor a classify_all
+run pays for loading. Which model is active comes from configuration:
+
+    CATCAM_CLASSIFIER          model name (default "stub")
+    CATCAM_CLASSIFIER_OPTIONS  JSON object of keyword arguments for its factory
+    CATCAM_CLASSIFIER_PLUGINS  comma-separated modules to import first; they
+                               call register() for their own models
+
+load_configured() loads and warms the active model (the server does this at
+startup); otherwise it is loaded on first use.
+"""
+
+import importlib
+import json
+import os
+import threading
+
+from .models import Classifier, FilenameClassifier
+
+CLASSIFIER_NAME = os.environ.get('CATCAM_CLASSIFIER', 'stub')
+CLASSIFIER_OPTIONS = json.loads(os.environ.get('CATCAM_CLASSIFIER_OPTIONS', '{}'))
+CLASSIFIER_PLUGINS = [m.strip() for m in os.environ.get('CATCAM_CLASSIFIER_PLUGINS', '').split(',') if m.strip()]
+
+_lock = threading.Lock()
+_factories = {}
+_loaded: dict[str, Classifier] = {}
+_plugins_imported = False
+
+
+def register(name: str, factory=None):
+    """Register a model factory (usually the Classifier subclass) under `name`.
+
+    Usable as a decorator: @register("yolo-cats").
+    """
+    def add(factory):
+        with _lock:
+            _factories[name] = factory
+            _loaded.pop(name, None)
+        return factory
+    return add(factory) if factory is not None else add
+
+
+def available() -> list[str]:
+    _import_plugins()
+    return sorted(_factories)
+
+
+def get_classifier(name: str | None = None, warmup: bool = False, **options) -> Classifier:
+    """The resident instance of model `name` (default: the configured one), loading it on first use.
+
+    `options` are passed to the factory on first load only (defaults to
+    CATCAM_CLASSIFIER_OPTIONS for the configured model).
+    """
+    _import_plugins()
+    name = name or CLASSIFIER_NAME
+    model = _loaded.get(name)
+    if model is not None:
+        return model
+    with _lock:
+        model = _loaded.get(name)
+        if model is None:
+            factory = _factories.get(name)
+            if factory is None:
+                raise KeyError(f"unknown classifier {name!r}; registered: {sorted(_factories)}")
+            if not options and name == CLASSIFIER_NAME:
+                options = CLASSIFIER_OPTIONS
+            model = factory(**options)
+            model.load()
+            if warmup:
+                model.warmup()
+            _loaded[name] = model
+    return model
+
+
+def load_configured() -> Classifier:
+    """Load and warm up the configured model now (call once at process start)."""
+    return get_classifier(warmup=True)
+
+
+def unload(name: str | None = None) -> None:
+    """Drop resident models (all of them when name is None)."""
+    with _lock:
+        if name is None:
+            _loaded.clear()
+        else:
+            _loaded.pop(name, None)
+
+
+def _import_plugins() -> None:
+    global _plugins_imported
+    if _plugins_imported:
+        return
+    for module in CLASSIFIER_PLUGINS:
+        importlib.import_module(module)
+    _plugins_imported = True
+
+
+register(FilenameClassifier.name, FilenameClassifier)
@@ -0,0 +1,81 @@
+import importlib
+
+import pytest
+
+import machineVisionLibrary
+from machineVisionLibrary import BatchClassifier, Classifier, registry
+
+
+class CountingModel(Classifier):
+    name = "counting"
+    version = "2.1"
+    loads = 0
+    warmups = 0
+
+    def __init__(self, threshold=0.5):
+        self.threshold = threshold
+
+    def load(self):
+        CountingModel.loads += 1
+
+    def warmup(self):
+        CountingModel.warmups += 1
+
+    def classify(self, filepath):
+        return "cat", self.threshold
+
+
+def test_models_load_once_and_stay_resident():
+    registry.register("counting", CountingModel)
+    try:
+        first = machineVisionLibrary.get_classifier("counting", warmup=True, threshold=0.7)
+        assert machineVisionLibrary.get_classifier("counting") is first
+        assert (CountingModel.loads, CountingModel.warmups) == (1, 1)
+        assert first.classify("x.jpg") == ("cat", 0.7)
+        assert "counting" in machineVisionLibrary.available()
+    finally:
+        registry.unload("counting")
+
+    try:
+        machineVisionLibrary.get_classifier("nope")
+        assert False, "expected KeyError"
+    except KeyError:
+        pass
+
+
+def test_models_must_implement_inference():
+    class NoClassify(Classifier):
+        name = "incomplete"
+
+    class NoPredict(BatchClassifier):
+        name = "incomplete-batch"
+
+    for model in (NoClassify, NoPredict):
+        with pytest.raises(TypeError):
+            model()
+
+
+def test_classify_records_model_name_and_version(tmp_path, monkeypatch):
+    images_dir = tmp_path / "images"
+    monkeypatch.setenv('CATCAM_IMAGES_DIR', str(images_dir))
+    monkeypatch.setenv('CATCAM_METADATA_DIR', str(tmp_path / "metadata"))
+
+    import catCamBackend.db_utils as db_utils
+    import catCamBackend.commands as commands
+    importlib.reload(db_utils)
+    importlib.reload(commands)
+
+    db_utils.init_db()
+    for name in ('a_cat.jpg', 'b.jpg', 'c.jpg'):
+        (images_dir / name).write_bytes(b'')
+    first, second, third = db_utils.insert_metadata_many([{'filename': n} for n in ('a_cat.jpg', 'b.jpg', 'c.jpg')])
+
+    # default: the configured registry model
+    meta = commands.classify_image(first)
+    assert (meta['classification'], meta['model_name'], meta['model_version']) == ('cat', 'stub', '1')
+
+    model = CountingModel(threshold=0.8)
+    commands.classify_all(classifier=model)
+    for image_id in (second, third):
+        meta = db_utils.get_metadata_by_id(image_id)
+        assert (meta['confidence'], meta['model_name'], meta['model_version']) == (0.8, 'counting', '2.1')
@@ -32,3 +32,55 @@ def test_classify_all_with_stub(tmp_path, monkeypatch):
     meta = db_utils.get_metadata_by_id(image_id)
     assert meta is not None
     assert meta['classified'] is True
+
+
+def test_insert_metadata_many_command(tmp_path, monkeypatch):
+    monkeypatch.setenv('CATCAM_IMAGES_DIR', str(tmp_path / "images"))
+    monkeypatch.setenv('CATCAM_METADATA_DIR', str(tmp_path / "metadata"))
+
+    import catCamBackend.db_utils as db_utils
+    import catCamBackend.commands as commands
+    importlib.reload(db_utils)
+    importlib.reload(commands)
+
+    db_utils.init_db()
+    res = commands.execute_command('insert_metadata_many', {'rows': [
+        {'filename': 'a.jpg', 'cameraId': 1},
+        {'filename': 'b.jpg', 'cameraId': 2},
+    ]})
+    assert len(res['ids']) == 2
+    assert db_utils.get_metadata_by_id(res['ids'][1])['cameraId'] == 2
+
+    assert 'error' in commands.execute_command('insert_metadata_many', {'rows': []})
+    assert 'error' in commands.execute_command('insert_metadata_many', {'rows': [{'cameraId': 1}]})
+
+
+def test_classify_all_batches_and_reports_errors(tmp_path, monkeypatch):
+    images_dir = tmp_path / "images"
+    monkeypatch.setenv('CATCAM_IMAGES_DIR', str(images_dir))
+    monkeypatch.setenv('CATCAM_METADATA_DIR', str(tmp_path / "metadata"))
+
+    import catCamBackend.db_utils as db_utils
+    import catCamBackend.commands as commands
+    importlib.reload(db_utils)
+    importlib.reload(commands)
+
+    db_utils.init_db()
+    names = [f'cat_{i}.jpg' for i in range(10)]
+    for name in names:
+        (images_dir / name).write_bytes(b'')
+    ids = db_utils.insert_metadata_many([{'filename': n} for n in names + ['missing.jpg', 'dog_done.jpg']])
+    db_utils.set_classifications([(ids[-1], 'dog', 0.9)])
+
+    def classifier(path):
+        if path.endswith('cat_3.jpg'):
+            raise RuntimeError('bad image')
+        return 'cat', 0.8
+
+    res = commands.classify_all(classifier=classifier, batch_size=4, workers=2)
+    assert res['total entries'] == 12
+    assert res['classified'] == 10
+    assert res['unclassified'] == 2
+    assert sorted(e['error'] for e in res['errors']) == ['bad image', 'image file missing']
+    assert db_utils.get_metadata_by_id(ids[0])['classification'] == 'cat'
+    assert db_utils.get_metadata_by_id(ids[-1])['classification'] == 'dog'
@@ -43,3 +43,292 @@ def test_db_init_and_crud(tmp_path, monkeypatch):
     ok = db_utils.delete_metadata(image_id)
     assert ok
     assert db_utils.get_metadata_by_id(image_id) is None
+
+
+def test_insert_metadata_many(tmp_path, monkeypatch):
+    images_dir = tmp_path / "images"
+    metadata_dir = tmp_path / "metadata"
+    images_dir.mkdir()
+    metadata_dir.mkdir()
+
+    monkeypatch.setenv('CATCAM_IMAGES_DIR', str(images_dir))
+    monkeypatch.setenv('CATCAM_METADATA_DIR', str(metadata_dir))
+
+    import catCamBackend.db_utils as db_utils
+    importlib.reload(db_utils)
+
+    db_utils.init_db()
+    assert db_utils.insert_metadata_many([]) == []
+    first = db_utils.insert_metadata('first.jpg')
+    db_utils.delete_metadata(first)
+    rows = [
+        {'filename': f'frame_{i}.jpg', 'cameraId': 1, 'file_type': 'jpg', 'confidence': 0.8}
+        for i in range(3)
+    ]
+    ids = db_utils.insert_metadata_many(rows)
+    assert ids == [first + 1, first + 2, first + 3]
+    assert [db_utils.get_metadata_by_id(i)['filename'] for i in ids] == ['frame_0.jpg', 'frame_1.jpg', 'frame_2.jpg']
+
+    all_meta = db_utils.get_all_metadata()
+    assert [m['filename'] for m in all_meta] == ['frame_0.jpg', 'frame_1.jpg', 'frame_2.jpg']
+    assert all(m['cameraId'] == 1 and m['confidence'] == 0.8 for m in all_meta)
+    assert all(m['classified'] is False for m in all_meta)
+
+
+def test_connection_reused_per_thread_in_wal_mode(tmp_path, monkeypatch):
+    import threading
+
+    monkeypatch.setenv('CATCAM_IMAGES_DIR', str(tmp_path / "images"))
+    monkeypatch.setenv('CATCAM_METADATA_DIR', str(tmp_path / "metadata"))
+
+    import catCamBackend.db_utils as db_utils
+    importlib.reload(db_utils)
+
+    db_utils.init_db()
+    conn = db_utils.get_connection()
+    assert db_utils.get_connection() is conn
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+
+    # other threads get their own connection
+    other = []
+    t = threading.Thread(target=lambda: other.append(db_utils.get_connection()))
+    t.start()
+    t.join()
+    assert other[0] is not conn
+
+    # a failed transaction is rolled back
+    try:
+        with db_utils.transaction() as c:
+            c.execute("INSERT INTO images (filename) VALUES ('rolled_back.jpg')")
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+    assert db_utils.get_all_metadata() == []
+
+    db_utils.close_connections()
+    assert db_utils.get_connection() is not conn
+
+
+def _create_baseline_db(tmp_path, monkeypatch):
+    import sqlite3
+
+    metadata_dir = tmp_path / "metadata"
+    metadata_dir.mkdir()
+    monkeypatch.setenv('CATCAM_IMAGES_DIR', str(tmp_path / "images"))
+    monkeypatch.setenv('CATCAM_METADATA_DIR', str(metadata_dir))
+
+    # a database created before migrations existed: table only, user_version 0
+    legacy = sqlite3.connect(metadata_dir / 'db.sqlite3')
+    legacy.execute('''
+        CREATE TABLE images (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            filename TEXT NOT NULL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            cameraId INTEGER,
+            file_type TEXT,
+            classification TEXT,
+            classified BOOLEAN,
+            confidence FLOAT
+        )
+    ''')
+    legacy.execute("INSERT INTO images (filename) VALUES ('old.jpg')")
+    legacy.commit()
+    legacy.close()
+
+
+def test_init_db_migrates_existing_database(tmp_path, monkeypatch):
+    _create_baseline_db(tmp_path, monkeypatch)
+
+    import catCamBackend.db_utils as db_utils
+    importlib.reload(db_utils)
+
+    db_utils.init_db()
+    conn = db_utils.get_connection()
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == db_utils.SCHEMA_VERSION
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert indexes == {'idx_images_timestamp_cover', 'idx_images_camera_cover', 'idx_images_classification_cover',
+                       'idx_images_classified_cover', 'idx_images_unsized', 'idx_jobs_kind_status'}
+    assert [m['filename'] for m in db_utils.get_all_metadata()] == ['old.jpg']
+
+    # current schema: nothing to do
+    assert db_utils.migrate() == db_utils.SCHEMA_VERSION
+
+
+def test_first_connection_migrates_without_init_db(tmp_path, monkeypatch):
+    import threading
+
+    _create_baseline_db(tmp_path, monkeypatch)
+    import catCamBackend.db_utils as db_utils
+    import catCamBackend.commands as commands
+    importlib.reload(db_utils)
+    importlib.reload(commands)
+
+    # read paths select the newer columns; whichever runs first upgrades the
+    # file, including iter_images on its private connection
+    results = []
+    worker = threading.Thread(target=lambda: results.append([m['filename'] for m in db_utils.iter_images()]))
+    worker.start()
+    worker.join()
+    assert results == [['old.jpg']]
+
+    res = commands.execute_command('get_images', {'limit': 10})
+    assert [m['filename'] for m in res['images']] == ['old.jpg']
+    assert res['images'][0]['model_name'] is None
+    assert db_utils.get_connection().execute("PRAGMA user_version").fetchone()[0] == db_utils.SCHEMA_VERSION
+
+def test_query_images_keyset_pagination(tmp_path, monkeypatch):
+    monkeypatch.setenv('CATCAM_IMAGES_DIR', str(tmp_path / "images"))
+    monkeypatch.setenv('CATCAM_METADATA_DIR', str(tmp_path / "metadata"))
+
+    import catCamBackend.db_utils as db_utils
+    importlib.reload(db_utils)
+
+    db_utils.init_db()
+    # several rows share a timestamp so the id tie-breaker matters
+    with db_utils.transaction() as conn:
+        conn.executemany(
+            "INSERT INTO images (filename, timestamp, cameraId) VALUES (?, ?, ?)",
+            [(f'{i}.jpg', f'2025-01-01 00:00:{i // 3:02d}', i % 2) for i in range(10)]
+        )
+    expected = [m['id'] for m in db_utils.query_images()]
+
+    seen = []
+    cursor = None
+    while True:
+        page, cursor = db_utils.query_images_page(4, cursor=cursor)
+        seen.extend(m['id'] for m in page)
+        if cursor is None:
+            break
+    assert seen == expected
+    assert len(seen) == 10
+
+    # filters combine with the cursor
+    page, cursor = db_utils.query_images_page(2, cameraId=1)
+    rest = db_utils.query_images(cameraId=1, cursor=cursor)
+    assert [m['id'] for m in page + rest] == [m['id'] for m in db_utils.query_images(cameraId=1)]
+
+    try:
+        db_utils.query_images(cursor='not-a-cursor')
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+
+    for limit in (0, -1):
+        try:
+            db_utils.query_images_page(limit)
+            assert False, "expected ValueError"
+        except ValueError:
+            pass
+
+
+def test_iter_images_streams_in_batches(tmp_path, monkeypatch):
+    monkeypatch.setenv('CATCAM_IMAGES_DIR', str(tmp_path / "images"))
+    monkeypatch.setenv('CATCAM_METADATA_DIR', str(tmp_path / "metadata"))
+
+    import catCamBackend.db_utils as db_utils
+    importlib.reload(db_utils)
+
+    db_utils.init_db()
+    db_utils.insert_metadata_many([{'filename': f'{i}.jpg', 'cameraId': i % 3} for i in range(25)])
+
+    rows = db_utils.iter_images(cameraId=1, batch_size=4)
+    assert not isinstance(rows, list)
+    assert list(rows) == db_utils.query_images(cameraId=1)
+    assert len(list(db_utils.iter_images(batch_size=7))) == 25
+
+    # bad filters fail up front, not on the first next()
+    try:
+        db_utils.iter_images(cursor='not-a-cursor')
+        assert False, "expected ValueError"
+    except ValueError:
+        pass
+
+
+def test_metadata_cache_hits_and_invalidation(tmp_path, monkeypatch):
+    monkeypatch.setenv('CATCAM_IMAGES_DIR', str(tmp_path / "images"))
+    monkeypatch.setenv('CATCAM_METADATA_DIR', str(tmp_path / "metadata"))
+
+    import catCamBackend.db_utils as db_utils
+    importlib.reload(db_utils)
+
+    db_utils.init_db()
+    a, b = db_utils.insert_metadata_many([{'filename': 'a.jpg'}, {'filename': 'b.jpg'}])
+    cache = db_utils.metadata_cache
+
+    assert db_utils.get_metadata_by_id(a)['filename'] == 'a.jpg'
+    db_utils.get_metadata_by_id(a)['filename'] = 'mutated'
+    assert db_utils.get_metadata_by_id(a)['filename'] == 'a.jpg'
+    assert (cache.hits, cache.misses) == (2, 1)
+
+    db_utils.update_metadata(a, classification='cat')
+    assert db_utils.get_metadata_by_id(a)['classification'] == 'cat'
+    db_utils.set_classifications([(a, 'dog', 0.5)])
+    assert db_utils.get_metadata_by_id(a)['classification'] == 'dog'
+
+    db_utils.get_metadata_by_id(b)
+    db_utils.delete_metadata(b)
+    assert db_utils.get_metadata_by_id(b) is None
+    db_utils.clear_images()
+    assert db_utils.get_metadata_by_id(a) is None
+
+    # a read that raced an invalidation must not cache its stale row
+    generation = cache.generation
+    cache.invalidate(a)
+    cache.put(a, {'id': a}, generation)
+    assert cache.get(a) is None
+
+    # LRU bound and TTL
+    small = db_utils.MetadataCache(maxsize=2, ttl=60)
+    for key in (1, 2, 1, 3):
+        small.put(key, {'id': key}, small.generation)
+    assert small.get(2) is None and small.get(1) is not None
+    expired = db_utils.MetadataCache(maxsize=2, ttl=0)
+    expired.put(1, {'id': 1}, expired.generation)
+    assert expired.get(1) is None
+    assert expired.stats()['size'] == 0
+
+
+def test_query_images_label_confidence_and_camera_filters(tmp_path, monkeypatch):
+    monkeypatch.setenv('CATCAM_IMAGES_DIR', str(tmp_path / "images"))
+    monkeypatch.setenv('CATCAM_METADATA_DIR', str(tmp_path / "metadata"))
+
+    import catCamBackend.db_utils as db_utils
+    importlib.reload(db_utils)
+
+    db_utils.init_db()
+    rows = [
+        {'filename': f'{i}.jpg', 'cameraId': i % 4, 'classification': ['cat', 'dog'][i % 2],
+         'confidence': (i % 10) / 10, 'classified': True}
+        for i in range(40)
+    ]
+    db_utils.insert_metadata_many(rows)
+
+    cats = db_utils.query_images(classification='cat', min_confidence=0.8, since='2000-01-01', limit=100)
+    assert cats and all(m['classification'] == 'cat' and m['confidence'] >= 0.8 for m in cats)
+    assert len(cats) == sum(1 for r in rows if r['classification'] == 'cat' and r['confidence'] >= 0.8)
+
+    some = db_utils.query_images(cameraId=[1, 2], max_confidence=0.3)
+    assert {m['cameraId'] for m in some} == {1, 2}
+    assert all(m['confidence'] <= 0.3 for m in some)
+    assert db_utils.query_images(cameraId=[3]) == db_utils.query_images(cameraId=3)
+
+    # page ids come from an index-only scan, whatever the filter mix
+    for filters in (
+        {'classification': 'cat', 'min_confidence': 0.8, 'since': '2000-01-01'},
+        {'cameraId': [1, 2], 'max_confidence': 0.3},
+        {'cameraId': 3, 'min_confidence': 0.5},
+        {'min_confidence': 0.9},
+        {'classified': True, 'cameraId': 3},
+        {'classified': True, 'classification': 'cat'},
+        {'classified': True, 'cameraId': [1, 2], 'min_confidence': 0.5},
+        {'classified': False, 'since': '2000-01-01'},
+    ):
+        plan = db_utils.explain_query_images(limit=50, **filters)
+        scans = [line for line in plan if line.startswith(('SCAN', 'SEARCH')) and 'PRIMARY KEY' not in line]
+        assert scans and all('COVERING INDEX' in line for line in scans), (filters, plan)
+        # the page's ids come out of the index in order; only the final <= limit
+        # rows are sorted, plus a merge of the per-camera ranges for cameraId IN
+        merges = isinstance(filters.get('cameraId'), list) and any('idx_images_camera_cover' in line for line in scans)
+        assert sum('TEMP B-TREE' in line for line in plan) == 1 + merges, (filters, plan)
+    plan = db_utils.explain_query_images(limit=50, classification='cat', min_confidence=0.8, since='2000-01-01')
+    assert any('idx_images_classification_cover (classification=? AND timestamp>?)' in line for line in plan)
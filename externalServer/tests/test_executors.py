@@ -0,0 +1,35 @@
+import asyncio
+import threading
+
+from catCamBackend import executors
+
+
+def test_reads_do_not_queue_behind_writes():
+    release = threading.Event()
+
+    async def scenario():
+        slow_write = asyncio.ensure_future(executors.run_write(release.wait, 5))
+        queued_write = asyncio.ensure_future(executors.run_write(threading.current_thread))
+        # the writer thread is busy, but reads and cpu work still go through
+        read_thread = await asyncio.wait_for(executors.run_read(threading.current_thread), 1)
+        cpu_thread = await asyncio.wait_for(executors.run_cpu(threading.current_thread), 1)
+        assert not queued_write.done()
+        release.set()
+        await slow_write
+        write_thread = await queued_write
+        return read_thread.name, cpu_thread.name, write_thread.name
+
+    read_name, cpu_name, write_name = asyncio.run(scenario())
+    assert read_name.startswith("db-read")
+    assert cpu_name.startswith("cpu")
+    assert write_name.startswith("db-write")
+
+
+def test_pools_restart_after_shutdown():
+    async def thread_name():
+        return (await executors.run_read(threading.current_thread)).name
+
+    assert asyncio.run(thread_name()).startswith("db-read")
+    executors.shutdown()
+    # e.g. a second app startup in the same process
+    assert asyncio.run(thread_name()).startswith("db-read")
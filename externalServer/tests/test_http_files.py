@@ -0,0 +1,38 @@
+import os
+
+import pytest
+
+from catCamBackend import http_files
+
+
+def test_parse_range():
+    size = 1000
+    assert http_files.parse_range(None, size) is None
+    assert http_files.parse_range('bytes=0-99', size) == (0, 99)
+    assert http_files.parse_range('bytes=900-', size) == (900, 999)
+    assert http_files.parse_range('bytes=-100', size) == (900, 999)
+    assert http_files.parse_range('bytes=-5000', size) == (0, 999)
+    assert http_files.parse_range('bytes=990-2000', size) == (990, 999)
+    # ignored: whole file is sent
+    for header in ('items=0-1', 'bytes=0-1,5-6', 'bytes=abc', 'bytes=5-1', 'bytes=-', 'bytes=1'):
+        assert http_files.parse_range(header, size) is None
+    for header in ('bytes=1000-', 'bytes=-0'):
+        with pytest.raises(ValueError):
+            http_files.parse_range(header, size)
+
+
+def test_etag_identity_and_matching(tmp_path):
+    path = tmp_path / 'frame.jpg'
+    path.write_bytes(b'one')
+    st = os.stat(path)
+    etag = http_files.file_etag(st)
+    assert etag.startswith('"') and not etag.startswith('W/')
+
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1000))
+    assert http_files.file_etag(os.stat(path)) != etag
+
+    assert http_files.etag_matches(etag, etag)
+    assert http_files.etag_matches(f'"other", W/{etag}', etag)
+    assert http_files.etag_matches('*', etag)
+    assert not http_files.etag_matches('"other"', etag)
+    assert not http_files.etag_matches(None, etag)
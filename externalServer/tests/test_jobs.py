@@ -0,0 +1,88 @@
+import importlib
+import threading
+
+
+def _setup(tmp_path, monkeypatch, count):
+    images_dir = tmp_path / "images"
+    monkeypatch.setenv('CATCAM_IMAGES_DIR', str(images_dir))
+    monkeypatch.setenv('CATCAM_METADATA_DIR', str(tmp_path / "metadata"))
+
+    import catCamBackend.db_utils as db_utils
+    import catCamBackend.commands as commands
+    import catCamBackend.jobs as jobs
+    importlib.reload(db_utils)
+    importlib.reload(commands)
+    importlib.reload(jobs)
+
+    db_utils.init_db()
+    names = [f'cat_{i}.jpg' for i in range(count)]
+    for name in names:
+        (images_dir / name).write_bytes(b'')
+    ids = db_utils.insert_metadata_many([{'filename': n} for n in names])
+    return db_utils, jobs, ids
+
+
+def test_classify_job_runs_once_and_can_be_cancelled(tmp_path, monkeypatch):
+    db_utils, jobs, ids = _setup(tmp_path, monkeypatch, 10)
+
+    entered = threading.Event()
+    release = threading.Event()
+
+    def slow_classifier(path):
+        entered.set()
+        release.wait(5)
+        return 'cat', 0.9
+
+    job = jobs.submit_classify_job(classifier=slow_classifier, batch_size=2)
+    assert job['total'] == 10
+
+    # only one classify job at a time
+    busy = jobs.submit_classify_job()
+    assert busy['job_id'] == job['id'] and 'error' in busy
+
+    # cancel while the first batch is in flight; it still gets written
+    assert entered.wait(5)
+    jobs.cancel_job(job['id'])
+    release.set()
+    done = jobs.wait_for_job(job['id'], timeout=5)
+    assert done['status'] == 'cancelled'
+    assert done['processed'] == 2
+    assert db_utils.count_images()['unclassified'] == 8
+
+    # a new job can start once the old one stopped
+    job = jobs.submit_classify_job(batch_size=3)
+    done = jobs.wait_for_job(job['id'], timeout=5)
+    assert done['status'] == 'completed'
+    assert done['processed'] == 8 and done['errors'] == 0
+    assert db_utils.count_images()['unclassified'] == 0
+
+
+def test_interrupted_job_resumes_after_last_batch(tmp_path, monkeypatch):
+    db_utils, jobs, ids = _setup(tmp_path, monkeypatch, 6)
+
+    # as left behind by a process that died after writing its first batch
+    job_id, _ = db_utils.create_job('classify', total=6)
+    db_utils.set_classifications([(i, 'cat', 0.9) for i in ids[:2]])
+    db_utils.update_job(job_id, status='running', processed=2, last_id=ids[1], run_seconds=1.0)
+    (tmp_path / "images" / 'cat_4.jpg').unlink()
+
+    assert jobs.resume_jobs() == [job_id]
+    done = jobs.wait_for_job(job_id, timeout=5)
+    assert done['status'] == 'completed'
+    assert done['processed'] == 6
+    assert done['errors'] == 1
+    assert done['error_samples'] == [{'id': ids[4], 'error': 'image file missing'}]
+    assert done['throughput'] > 0
+
+
+def test_resume_jobs_without_database(tmp_path, monkeypatch):
+    monkeypatch.setenv('CATCAM_IMAGES_DIR', str(tmp_path / "images"))
+    monkeypatch.setenv('CATCAM_METADATA_DIR', str(tmp_path / "metadata"))
+
+    import catCamBackend.db_utils as db_utils
+    import catCamBackend.jobs as jobs
+    importlib.reload(db_utils)
+    importlib.reload(jobs)
+
+    # server startup before init_db must not fail
+    assert jobs.resume_jobs() == []
@@ -0,0 +1,80 @@
+import importlib
+
+import pytest
+
+np = pytest.importorskip("numpy")
+Image = pytest.importorskip("PIL.Image")
+
+from machineVisionLibrary import BatchClassifier
+from machineVisionLibrary.preprocess import BatchPreprocessor
+
+
+def test_preprocessor_fills_reused_nhwc_buffer(tmp_path):
+    paths = []
+    for i, size in enumerate([(640, 480), (32, 32)]):
+        path = tmp_path / f"{i}.jpg"
+        Image.new("RGB", size, (255, 0, 0)).save(path, "JPEG")
+        paths.append(str(path))
+    bad = tmp_path / "bad.jpg"
+    bad.write_bytes(b"not a jpeg")
+    paths.append(str(bad))
+
+    pre = BatchPreprocessor((48, 64), batch_size=4)
+    try:
+        batch, errors = pre.load(paths)
+        assert batch.shape == (3, 48, 64, 3) and batch.dtype == np.float32
+        assert list(errors) == [2]
+        assert batch[0, ..., 0].min() > 0.9 and batch[2].max() == 0
+        again, _ = pre.load(paths[:1])
+        assert again.base is batch.base is not None
+        with pytest.raises(ValueError):
+            pre.load(paths * 2)
+    finally:
+        pre.close()
+
+
+class BrightnessModel(BatchClassifier):
+    name = "brightness"
+    version = "1"
+    input_size = (16, 16)
+    batch_size = 2
+    batches = []
+
+    def predict(self, batch):
+        BrightnessModel.batches.append(len(batch))
+        return [("cat" if frame.mean() > 0.5 else "unknown", float(frame.mean())) for frame in batch]
+
+
+def test_classify_all_feeds_batch_classifier(tmp_path, monkeypatch):
+    images_dir = tmp_path / "images"
+    monkeypatch.setenv('CATCAM_IMAGES_DIR', str(images_dir))
+    monkeypatch.setenv('CATCAM_METADATA_DIR', str(tmp_path / "metadata"))
+
+    import catCamBackend.db_utils as db_utils
+    import catCamBackend.commands as commands
+    importlib.reload(db_utils)
+    importlib.reload(commands)
+
+    db_utils.init_db()
+    names = ['white.jpg', 'black.jpg', 'broken.jpg', 'missing.jpg', 'white2.jpg']
+    Image.new("RGB", (40, 30), (255, 255, 255)).save(images_dir / 'white.jpg')
+    Image.new("RGB", (40, 30), (0, 0, 0)).save(images_dir / 'black.jpg')
+    (images_dir / 'broken.jpg').write_bytes(b'junk')
+    Image.new("RGB", (40, 30), (255, 255, 255)).save(images_dir / 'white2.jpg')
+    ids = db_utils.insert_metadata_many([{'filename': n} for n in names])
+
+    model = BrightnessModel()
+    model.load()
+    try:
+        result = commands.classify_all(classifier=model, batch_size=3)
+    finally:
+        model.preprocessor.close()
+
+    assert result['classified'] == 3
+    assert sorted(e['id'] for e in result['errors']) == [ids[2], ids[3]]
+    # batch_size rounds down to whole model batches; missing files never reach the model
+    assert BrightnessModel.batches == [2, 1, 1]
+    labels = {i: db_utils.get_metadata_by_id(i)['classification'] for i in ids}
+    assert labels[ids[0]] == labels[ids[4]] == 'cat'
+    assert (labels[ids[1]], labels[ids[2]]) == ('unknown', None)
+    assert db_utils.get_metadata_by_id(ids[0])['model_name'] == 'brightness'
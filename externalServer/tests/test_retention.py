@@ -0,0 +1,81 @@
+import importlib
+import json
+from datetime import datetime, timezone
+
+
+def _setup(tmp_path, monkeypatch):
+    images_dir = tmp_path / "images"
+    monkeypatch.setenv('CATCAM_IMAGES_DIR', str(images_dir))
+    monkeypatch.setenv('CATCAM_METADATA_DIR', str(tmp_path / "metadata"))
+
+    import catCamBackend.db_utils as db_utils
+    import catCamBackend.retention as retention
+    importlib.reload(db_utils)
+    importlib.reload(retention)
+    db_utils.init_db()
+    return db_utils, retention, images_dir
+
+
+def _add(db_utils, images_dir, filename, timestamp, cameraId=1, classification=None, size=100):
+    (images_dir / filename).write_bytes(b'x' * size)
+    with db_utils.transaction() as conn:
+        cursor = conn.execute(
+            "INSERT INTO images (filename, timestamp, cameraId, classification, classified) VALUES (?, ?, ?, ?, ?)",
+            (filename, timestamp, cameraId, classification, classification is not None)
+        )
+    return cursor.lastrowid
+
+
+def test_age_rules_per_classification(tmp_path, monkeypatch):
+    db_utils, retention, images_dir = _setup(tmp_path, monkeypatch)
+    now = datetime(2025, 6, 30, tzinfo=timezone.utc)
+    old_cat = _add(db_utils, images_dir, 'old_cat.jpg', '2025-03-01 00:00:00', classification='cat')
+    cat = _add(db_utils, images_dir, 'cat.jpg', '2025-06-01 00:00:00', classification='cat')
+    old_unknown = _add(db_utils, images_dir, 'old_unknown.jpg', '2025-06-26 00:00:00', classification='unknown')
+    unknown = _add(db_utils, images_dir, 'unknown.jpg', '2025-06-29 12:00:00', classification='unknown')
+    unclassified = _add(db_utils, images_dir, 'new.jpg', '2020-01-01 00:00:00')
+
+    rules = [retention.RetentionRule(classification='cat', max_age_days=90),
+             retention.RetentionRule(classification='unknown', max_age_days=3)]
+    report = retention.run_retention(rules, now=now, batch_size=1)
+
+    assert report['deleted'] == 2
+    assert report['bytes_reclaimed'] == 200
+    assert [r['deleted'] for r in report['rules']] == [1, 1]
+    remaining = {m['id'] for m in db_utils.query_images()}
+    assert remaining == {cat, unknown, unclassified}
+    assert not (images_dir / 'old_cat.jpg').exists()
+    assert not (images_dir / 'old_unknown.jpg').exists()
+    assert db_utils.get_metadata_by_id(old_cat) is None
+    assert db_utils.get_metadata_by_id(old_unknown) is None
+    assert retention.recent_reports()[-1] is report
+
+
+def test_byte_quota_per_camera_keeps_newest(tmp_path, monkeypatch):
+    db_utils, retention, images_dir = _setup(tmp_path, monkeypatch)
+    ids = [_add(db_utils, images_dir, f'c1_{i}.jpg', f'2025-01-0{i + 1} 00:00:00', cameraId=1) for i in range(5)]
+    other = _add(db_utils, images_dir, 'c2.jpg', '2024-01-01 00:00:00', cameraId=2, size=1000)
+
+    policy = tmp_path / 'policy.json'
+    policy.write_text(json.dumps({'rules': [{'cameraId': 1, 'max_bytes': 250}]}))
+    report = retention.run_retention(retention.load_policy(str(policy)), batch_size=2)
+
+    assert report['deleted'] == 3
+    assert report['bytes_reclaimed'] == 300
+    assert {m['id'] for m in db_utils.query_images()} == {ids[3], ids[4], other}
+
+    # a second run has nothing left to do
+    assert retention.run_retention(retention.load_policy(str(policy)))['deleted'] == 0
+
+
+def test_victim_selection_uses_indexes(tmp_path, monkeypatch):
+    db_utils, retention, images_dir = _setup(tmp_path, monkeypatch)
+    plan = db_utils.get_connection().execute(
+        "EXPLAIN QUERY PLAN SELECT id, filename FROM images WHERE classification = ? AND timestamp < ? ORDER BY timestamp, id LIMIT ?",
+        ('cat', '2025-01-01', 10)
+    ).fetchall()
+    assert 'idx_images_classification_cover' in ' '.join(row[-1] for row in plan)
+    plan = db_utils.get_connection().execute(
+        "EXPLAIN QUERY PLAN SELECT id, filename FROM images WHERE file_size IS NULL LIMIT 10"
+    ).fetchall()
+    assert 'idx_images_unsized' in ' '.join(row[-1] for row in plan)
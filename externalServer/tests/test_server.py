@@ -0,0 +1,224 @@
+import csv
+import importlib
+import io
+import json
+import sqlite3
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+def _reload_backend(tmp_path, monkeypatch):
+    monkeypatch.setenv('CATCAM_IMAGES_DIR', str(tmp_path / "images"))
+    monkeypatch.setenv('CATCAM_METADATA_DIR', str(tmp_path / "metadata"))
+
+    import catCamBackend.db_utils as db_utils
+    import catCamBackend.commands as commands
+    import catCamBackend.jobs as jobs
+    import catCamBackend.server as server
+    importlib.reload(db_utils)
+    importlib.reload(commands)
+    importlib.reload(jobs)
+    return db_utils, server
+
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    db_utils, server = _reload_backend(tmp_path, monkeypatch)
+    with TestClient(server.app) as client:
+        yield db_utils, server, client
+    db_utils.close_connections()
+
+
+def test_startup_migrates_baseline_database(tmp_path, monkeypatch):
+    metadata_dir = tmp_path / "metadata"
+    metadata_dir.mkdir()
+    # the schema shipped before migrations existed: table only, user_version 0
+    legacy = sqlite3.connect(metadata_dir / 'db.sqlite3')
+    legacy.execute('''
+        CREATE TABLE images (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            filename TEXT NOT NULL,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            cameraId INTEGER,
+            file_type TEXT,
+            classification TEXT,
+            classified BOOLEAN,
+            confidence FLOAT
+        )
+    ''')
+    legacy.execute("INSERT INTO images (filename, cameraId) VALUES ('old.jpg', 1)")
+    legacy.commit()
+    legacy.close()
+
+    db_utils, server = _reload_backend(tmp_path, monkeypatch)
+    with TestClient(server.app) as client:
+        res = client.get('/images')
+    db_utils.close_connections()
+
+    assert res.status_code == 200
+    assert [row['filename'] for row in res.json()['images']] == ['old.jpg']
+
+
+def test_insert_batch_json_array_and_ndjson(backend):
+    db_utils, server, client = backend
+
+    res = client.post('/insert_metadata/batch', json=[{'filename': 'a.jpg', 'cameraId': 1}, {'filename': 'b.jpg'}])
+    assert res.status_code == 200
+    first = res.json()['ids']
+    assert len(first) == 2
+
+    body = "\n".join(json.dumps({'filename': f'n{i}.jpg', 'cameraId': 2}) for i in range(3)) + "\n\n"
+    res = client.post('/insert_metadata/batch', content=body, headers={'Content-Type': 'application/x-ndjson'})
+    assert res.status_code == 200
+    second = res.json()['ids']
+    assert len(second) == 3 and min(second) > max(first)
+
+    by_id = {m['id']: m for m in db_utils.get_all_metadata()}
+    assert [by_id[i]['filename'] for i in first + second] == ['a.jpg', 'b.jpg', 'n0.jpg', 'n1.jpg', 'n2.jpg']
+    assert by_id[second[0]]['cameraId'] == 2
+
+
+def test_insert_batch_rejects_oversized_body(backend, monkeypatch):
+    db_utils, server, client = backend
+    monkeypatch.setattr(server, 'MAX_BATCH_BYTES', 64)
+    rows = [{'filename': f'cat_{i}.jpg'} for i in range(10)]
+
+    # declared Content-Length over the limit
+    assert client.post('/insert_metadata/batch', json=rows).status_code == 413
+
+    # chunked NDJSON with no Content-Length, counted as it arrives
+    lines = (json.dumps(row).encode() + b"\n" for row in rows)
+    res = client.post('/insert_metadata/batch', content=lines, headers={'Content-Type': 'application/x-ndjson'})
+    assert res.status_code == 413
+    assert db_utils.get_all_metadata() == []
+
+
+def test_insert_batch_rejects_bad_rows(backend):
+    db_utils, server, client = backend
+
+    res = client.post('/insert_metadata/batch', json=[{'filename': 'ok.jpg'}, {'cameraId': 1}])
+    assert res.status_code == 422
+    assert client.post('/insert_metadata/batch', json={'filename': 'a.jpg'}).status_code == 400
+    assert client.post('/insert_metadata/batch', json=[]).status_code == 400
+    res = client.post('/insert_metadata/batch', content='{"filename": "a.jpg"}\nnot json\n',
+                      headers={'Content-Type': 'application/x-ndjson'})
+    assert res.status_code == 400
+    # nothing from a rejected batch is written
+    assert db_utils.get_all_metadata() == []
+
+
+def test_export_ndjson_csv_and_filters(backend, monkeypatch):
+    db_utils, server, client = backend
+    monkeypatch.setattr(server, 'EXPORT_CHUNK_ROWS', 2)
+    db_utils.insert_metadata_many([
+        {'filename': f'cat_{i}.jpg', 'cameraId': i % 2, 'classification': 'cat' if i % 2 else 'empty',
+         'classified': True, 'confidence': 0.5 + i / 100}
+        for i in range(5)
+    ])
+
+    res = client.get('/images/export')
+    assert res.status_code == 200
+    assert res.headers['content-type'].startswith('application/x-ndjson')
+    rows = [json.loads(line) for line in res.text.splitlines()]
+    assert [r['filename'] for r in rows] == [f'cat_{i}.jpg' for i in reversed(range(5))]
+    assert set(rows[0]) == set(server.EXPORT_FIELDS)
+
+    res = client.get('/images/export', params={'format': 'csv', 'cameraId': 1, 'classification': 'cat'})
+    assert res.status_code == 200
+    assert res.headers['content-type'].startswith('text/csv')
+    assert 'images.csv' in res.headers['content-disposition']
+    rows = list(csv.DictReader(io.StringIO(res.text)))
+    assert [r['filename'] for r in rows] == ['cat_3.jpg', 'cat_1.jpg']
+    assert list(rows[0]) == server.EXPORT_FIELDS
+
+    res = client.get('/images/export', params={'min_confidence': 0.53})
+    assert [json.loads(line)['filename'] for line in res.text.splitlines()] == ['cat_4.jpg', 'cat_3.jpg']
+
+    # a cursor from GET /images resumes the export after that page
+    cursor = client.get('/images', params={'limit': 2}).json()['next_cursor']
+    res = client.get('/images/export', params={'cursor': cursor})
+    assert [json.loads(line)['filename'] for line in res.text.splitlines()] == ['cat_2.jpg', 'cat_1.jpg', 'cat_0.jpg']
+
+
+def test_export_rejects_bad_cursor_and_format(backend):
+    db_utils, server, client = backend
+
+    res = client.get('/images/export', params={'cursor': 'not-a-cursor'})
+    assert res.status_code == 400
+    assert res.json()['detail'] == 'invalid cursor'
+    assert client.get('/images/export', params={'format': 'xml'}).status_code == 400
+
+
+def test_classify_all_runs_as_a_job(backend, tmp_path):
+    db_utils, server, client = backend
+    import catCamBackend.jobs as jobs
+    names = [f'cat_{i}.jpg' for i in range(3)]
+    for name in names:
+        (tmp_path / "images" / name).write_bytes(b'')
+    db_utils.insert_metadata_many([{'filename': n} for n in names])
+
+    res = client.post('/classify_all')
+    assert res.status_code == 200
+    summary = res.json()
+    assert summary['status'] == 'completed'
+    assert summary['total entries'] == 3 and summary['unclassified'] == 0
+    assert db_utils.get_job(summary['job_id'])['processed'] == 3
+
+    # one classify job at a time, however it was started
+    (tmp_path / "images" / 'late.jpg').write_bytes(b'')
+    db_utils.insert_metadata(filename='late.jpg')
+    entered, release = threading.Event(), threading.Event()
+
+    def slow_classifier(path):
+        entered.set()
+        release.wait(5)
+        return 'cat', 0.9
+
+    job = jobs.submit_classify_job(classifier=slow_classifier)
+    assert entered.wait(5)
+    res = client.post('/classify_all')
+    assert res.status_code == 409
+    assert res.json()['detail']['job_id'] == job['id']
+    release.set()
+    assert jobs.wait_for_job(job['id'], timeout=5)['status'] == 'completed'
+
+
+def test_raw_image_etag_ranges_and_revalidation(backend, tmp_path):
+    db_utils, server, client = backend
+    data = bytes(range(256)) * 4
+    (tmp_path / "images" / 'cat.jpg').write_bytes(data)
+    image_id = db_utils.insert_metadata(filename='cat.jpg')
+    url = f'/images/{image_id}/raw'
+
+    res = client.get(url)
+    assert res.status_code == 200
+    assert res.content == data
+    etag = res.headers['etag']
+    assert etag.startswith('"') and res.headers['cache-control'] == 'no-cache'
+    assert res.headers['accept-ranges'] == 'bytes'
+
+    res = client.get(url, headers={'If-None-Match': f'"other", {etag}'})
+    assert res.status_code == 304
+    assert res.content == b'' and res.headers['etag'] == etag
+
+    res = client.get(url, headers={'Range': 'bytes=10-19'})
+    assert res.status_code == 206
+    assert res.content == data[10:20]
+    assert res.headers['content-range'] == f'bytes 10-19/{len(data)}'
+
+    res = client.get(url, headers={'Range': 'bytes=-5', 'If-Range': etag})
+    assert res.status_code == 206
+    assert res.content == data[-5:]
+
+    res = client.get(url, headers={'Range': f'bytes={len(data)}-'})
+    assert res.status_code == 416
+    assert res.headers['content-range'] == f'bytes */{len(data)}'
+
+    # stale validator: the whole current file instead of a slice of it
+    res = client.get(url, headers={'Range': 'bytes=10-19', 'If-Range': '"stale"'})
+    assert res.status_code == 200
+    assert res.content == data
+
+    assert client.get('/images/999/raw').status_code == 404
@@ -0,0 +1,79 @@
+import importlib
+import os
+import threading
+
+import pytest
+
+Image = pytest.importorskip('PIL.Image')
+
+
+def _reload(tmp_path, monkeypatch, **env):
+    monkeypatch.setenv('CATCAM_IMAGES_DIR', str(tmp_path / "images"))
+    monkeypatch.setenv('CATCAM_METADATA_DIR', str(tmp_path / "metadata"))
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+
+    import catCamBackend.db_utils as db_utils
+    import catCamBackend.thumbnails as thumbnails
+    importlib.reload(db_utils)
+    importlib.reload(thumbnails)
+    return thumbnails
+
+
+def _frame(path, size=(640, 480)):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    Image.new('RGB', size, (200, 100, 50)).save(path, 'JPEG')
+    return str(path)
+
+
+def test_tiers_generated_once_for_concurrent_misses(tmp_path, monkeypatch):
+    thumbnails = _reload(tmp_path, monkeypatch)
+    source = _frame(tmp_path / "images" / "cat.jpg")
+
+    calls = []
+    generate = thumbnails._generate
+    started = threading.Event()
+
+    def slow_generate(src, key):
+        calls.append(src)
+        started.set()
+        threading.Event().wait(0.2)
+        generate(src, key)
+
+    monkeypatch.setattr(thumbnails, '_generate', slow_generate)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(thumbnails.get_thumbnail(source, 64))) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert len(set(results)) == 1
+    with Image.open(results[0]) as im:
+        assert max(im.size) == 64
+    # the other tier came from the same decode
+    with Image.open(thumbnails.get_thumbnail(source, 160)) as im:
+        assert im.size == (160, 120)
+    assert len(calls) == 1
+
+    with pytest.raises(ValueError):
+        thumbnails.get_thumbnail(source, 100)
+
+
+def test_cache_evicts_least_recently_used(tmp_path, monkeypatch):
+    thumbnails = _reload(tmp_path, monkeypatch, CATCAM_THUMBS_MAX_BYTES='1')
+    a = _frame(tmp_path / "images" / "a.jpg")
+    b = _frame(tmp_path / "images" / "b.jpg")
+
+    path_a = thumbnails.get_thumbnail(a, 64)
+    assert not os.path.exists(path_a)  # over budget straight away
+    thumbnails.THUMBS_MAX_BYTES = 10 ** 9
+    path_a = thumbnails.get_thumbnail(a, 64)
+    path_b = thumbnails.get_thumbnail(b, 64)
+    os.utime(path_a, ns=(1, 1))  # a was used long ago
+
+    thumbnails.THUMBS_MAX_BYTES = os.path.getsize(path_b) * 3
+    thumbnails._account(0)
+    assert not os.path.exists(path_a)
+    assert os.path.exists(path_b)